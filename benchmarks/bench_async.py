@@ -0,0 +1,102 @@
+# -*- coding:utf-8 -*-
+
+"""Compare AsyncTagger with run_in_executor under concurrent requests.
+
+Each of --concurrency clients sends its sentences one by one and awaits
+each result. The throughput and the latency percentiles are written as JSON.
+
+    $ python benchmarks/bench_async.py --concurrency 40 --engine numpy
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import io
+import sys
+import glob
+import json
+import time
+import asyncio
+import concurrent.futures
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import nagisa
+from nagisa.async_tagger import AsyncTagger
+
+
+def load_sentences(num):
+    texts = []
+    for fn in sorted(glob.glob(os.path.join(ROOT, 'docs', '*.rst'))):
+        with io.open(fn, encoding='utf-8') as f:
+            texts += [line.strip() for line in f if line.strip()]
+    return (texts * (num // len(texts) + 1))[:num]
+
+
+async def run(tag, texts, concurrency):
+    latencies = []
+
+    async def client(client_texts):
+        for text in client_texts:
+            t = time.time()
+            await tag(text)
+            latencies.append(time.time() - t)
+
+    t = time.time()
+    await asyncio.gather(*[client(texts[i::concurrency]) for i in range(concurrency)])
+    elapsed = time.time() - t
+    return {'sentences_per_s': len(texts) / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+            'p99_ms': float(np.percentile(latencies, 99)) * 1000}
+
+
+async def run_executor(tagger, texts, concurrency):
+    loop = asyncio.get_event_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    # str() makes the words and the POS-tags, which are computed lazily.
+    tag = lambda text: loop.run_in_executor(executor, lambda: str(tagger.tagging(text)))
+    try:
+        return await run(tag, texts, concurrency)
+    finally:
+        executor.shutdown()
+
+
+async def run_async(tagger, texts, concurrency, max_delay):
+    async_tagger = AsyncTagger(tagger, max_delay=max_delay)
+    try:
+        result = await run(async_tagger.tagging, texts, concurrency)
+    finally:
+        await async_tagger.close()
+    result.update(async_tagger.info())
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='AsyncTagger benchmark of nagisa.')
+    parser.add_argument('--engine', type=str, default='dynet', help="'dynet' or 'numpy'.")
+    parser.add_argument('--num', type=int, default=400, help='The number of sentences.')
+    parser.add_argument('--concurrency', type=int, default=40,
+                        help='The number of concurrent clients.')
+    parser.add_argument('--max_delay', type=float, default=0.005,
+                        help='The max_delay of AsyncTagger.')
+    parser.add_argument('--output', type=str, default=None, help='Output JSON file.')
+    args = parser.parse_args()
+
+    tagger = nagisa.Tagger(engine=args.engine)
+    texts = load_sentences(args.num)
+    tagger.tagging_batch(texts[:10])
+
+    results = {'run_in_executor': asyncio.run(run_executor(tagger, texts, args.concurrency)),
+               'async_tagger': asyncio.run(run_async(tagger, texts, args.concurrency,
+                                                     args.max_delay))}
+
+    out = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+    print(out)
@@ -0,0 +1,64 @@
+# -*- coding:utf-8 -*-
+
+"""Measure the time to import nagisa and to build the default tagger.
+
+Each measurement runs in a new Python process, and the median of
+the repeats is written as JSON.
+
+    $ python benchmarks/bench_import.py --repeat 5
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ('import', 'import nagisa'),
+    ('import_client', 'import nagisa.client'),
+    ('import_and_tag', 'import nagisa; nagisa.tagging("Pythonで簡単に使えるツールです")'),
+    ('import_numpy_engine',
+     'import nagisa; nagisa.Tagger(engine="numpy").tagging("Pythonで簡単に使えるツールです")'),
+]
+
+
+def measure(code, repeat):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, env.get('PYTHONPATH', '')])
+    times = []
+    for _ in range(repeat):
+        t = time.time()
+        subprocess.check_call([sys.executable, '-c', code], env=env)
+        times.append(time.time() - t)
+    times.sort()
+    return {'median_s': times[len(times)//2], 'min_s': times[0], 'repeat': repeat}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Import time benchmark of nagisa.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of repeats.')
+    parser.add_argument('--output', type=str, default=None, help='Output JSON file.')
+    args = parser.parse_args()
+
+    # The startup time of the interpreter is subtracted from the results.
+    baseline = measure('pass', args.repeat)['median_s']
+    results = {'python_startup_s': baseline}
+    for name, code in CASES:
+        r = measure(code, args.repeat)
+        r['median_s'] -= baseline
+        r['min_s'] -= baseline
+        results[name] = r
+
+    out = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+    print(out)
@@ -0,0 +1,284 @@
+# -*- coding:utf-8 -*-
+
+"""Measure each stage of the tagging pipeline on generated and sample corpora.
+
+For each corpus, the inputs of a stage are made by the previous stages in advance,
+and only the stage is timed, one sentence per call. The throughput, the latency
+percentiles and the peak memory (of the Python allocations, by tracemalloc) of
+each stage, the time to build a Tagger and the import time are written as JSON.
+
+    $ python benchmarks/bench_pipeline.py --engine numpy --output numpy.json
+    $ python benchmarks/bench_pipeline.py --engine numpy --baseline numpy.json
+
+The stages are:
+
+    preprocess          nagisa_utils.preprocess
+    feature_extraction  Tagger._feature_extraction (nagisa_utils.feature_extraction)
+    encode_ws           Model.ws_observations (encode_ws and the evaluation)
+    np_viterbi          nagisa_utils.np_viterbi
+    segmenter_for_bmes  nagisa_utils.segmenter_for_bmes
+    encode_pt           Model.POStagging (encode_pt and the argmax)
+    postagging          Tagger._postagging (the inputs, encode_pt and the POS-tags)
+    tagging             str(Tagger.tagging(text))
+    tagging_batch       Tagger.tagging_batch (the throughput of the whole corpus)
+
+The corpora are generated from the scripts of MIXES with a fixed seed,
+so the runs on different versions can be compared.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import io
+import gc
+import sys
+import json
+import time
+import random
+import platform
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import nagisa
+import nagisa_utils as utils
+
+timer = getattr(time, 'perf_counter', time.time)
+
+SCRIPTS = {
+    'hiragana': u'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをんがでにはの',
+    'katakana': u'アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワンガギグゲゴパピプペポー',
+    'kanji': u'日本語東京都大学研究自然言語処理単語分割品詞解析時間今年会社社会問題情報技術使用可能最新',
+    'latin': u'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    'digit': u'0123456789',
+    'symbol': u'、。！？「」（）・',
+    'emoji': u'😀😂👍🎉✨❤',
+}
+
+# The weights of the scripts in a generated corpus.
+MIXES = {
+    'ja': {'hiragana': 5, 'kanji': 4, 'katakana': 2, 'symbol': 1},
+    'ja_latin': {'hiragana': 4, 'kanji': 3, 'katakana': 1, 'latin': 2, 'digit': 1, 'symbol': 1},
+    'kana': {'hiragana': 1, 'katakana': 1},
+    'latin': {'latin': 6, 'digit': 1, 'symbol': 1},
+    'emoji': {'hiragana': 4, 'kanji': 2, 'emoji': 2, 'symbol': 1},
+}
+
+STAGES = ['preprocess', 'feature_extraction', 'encode_ws', 'np_viterbi', 'segmenter_for_bmes',
+          'encode_pt', 'postagging', 'tagging', 'tagging_batch']
+
+
+def generate_corpus(num, length, mix, seed=0):
+    """Return num sentences of the length, made of runs of 1-4 characters of the scripts."""
+    rng = random.Random(seed)
+    # A script appears in the list as many times as its weight.
+    scripts = [s for s in sorted(MIXES[mix]) for _ in range(MIXES[mix][s])]
+    texts = []
+    for _ in range(num):
+        chars = []
+        while len(chars) < length:
+            pool = SCRIPTS[rng.choice(scripts)]
+            chars += [rng.choice(pool) for _ in range(rng.randint(1, 4))]
+        texts.append(u''.join(chars[:length]))
+    return texts
+
+
+def load_sample_corpus(num):
+    """Return the sentences of the bundled sample_datasets (sample.test and sample.dev)."""
+    texts = []
+    for name in ['sample.test', 'sample.dev']:
+        fn = os.path.join(ROOT, 'nagisa', 'data', 'sample_datasets', name)
+        words = []
+        with io.open(fn, encoding='utf_8_sig') as f:
+            for line in f:
+                line = line.rstrip()
+                if line == 'EOS':
+                    texts.append(u''.join(words))
+                    words = []
+                elif line:
+                    words.append(line.split('\t')[0])
+    return texts[:num]
+
+
+def measure(func, inputs, repeat):
+    """Call func for each input, repeat times, and return the statistics of the calls."""
+    latencies = []
+    for _ in range(repeat):
+        for x in inputs:
+            t = timer()
+            func(x)
+            latencies.append(timer() - t)
+    total = sum(latencies)
+    ms = np.array(latencies) * 1000
+    return {'calls': len(latencies), 'total_s': total,
+            'calls_per_s': len(latencies) / total if total > 0 else None,
+            'p50_ms': float(np.percentile(ms, 50)), 'p90_ms': float(np.percentile(ms, 90)),
+            'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max())}
+
+
+def peak_memory(func, inputs):
+    """Return the peak bytes allocated by Python while func is called for each input."""
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for x in inputs:
+            func(x)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def stage_functions(tagger):
+    """Return the function and the inputs of each stage for a list of sentences."""
+    model = tagger._model
+    trans = model.trans_array
+
+    def functions(texts):
+        pre = [utils.preprocess(text) for text in texts]
+        pre = [text for text in pre if text]
+        lower = [text.lower() for text in pre]
+        feats = [tagger._feature_extraction(text) for text in lower]
+        obs = [model.ws_observations(X) for X in feats]
+        tags = [utils.np_viterbi(trans, ob) for ob in obs]
+        words = [utils.segmenter_for_bmes(text, tag) for text, tag in zip(pre, tags)]
+        pt_inputs = [tagger._postagging_inputs(ws) for ws in words]
+        return {
+            'preprocess': (utils.preprocess, texts),
+            'feature_extraction': (tagger._feature_extraction, lower),
+            'encode_ws': (model.ws_observations, feats),
+            'np_viterbi': (lambda ob: utils.np_viterbi(trans, ob), obs),
+            # segmenter_for_bmes can modify the tags.
+            'segmenter_for_bmes': (lambda x: utils.segmenter_for_bmes(x[0], list(x[1])),
+                                   list(zip(pre, tags))),
+            'encode_pt': (model.POStagging, pt_inputs),
+            'postagging': (tagger._postagging, words),
+            'tagging': (lambda text: str(tagger.tagging(text)), texts),
+        }
+    return functions
+
+
+def bench_corpus(tagger, texts, repeat, stages, batch_size):
+    num_chars = sum(len(text) for text in texts)
+    result = {'sentences': len(texts), 'chars': num_chars, 'stages': {}}
+    functions = stage_functions(tagger)(texts)
+    for stage in stages:
+        if stage == 'tagging_batch':
+            func = lambda chunk: [str(t) for t in tagger.tagging_batch(chunk,
+                                                                       batch_size=batch_size)]
+            inputs = [texts]
+        else:
+            func, inputs = functions[stage]
+        func(inputs[0])
+        r = measure(func, inputs, repeat)
+        total = r['total_s']
+        r['chars_per_s'] = num_chars * repeat / total if total > 0 else None
+        r['sentences_per_s'] = len(texts) * repeat / total if total > 0 else None
+        r['peak_memory_bytes'] = peak_memory(func, inputs)
+        result['stages'][stage] = r
+    return result
+
+
+def bench_construction(engine, repeat):
+    """Return the time to build a Tagger when the model is loaded, and when it is shared."""
+    load = []
+    for _ in range(repeat):
+        gc.collect()
+        t = timer()
+        tagger = nagisa.Tagger(engine=engine)
+        load.append(timer() - t)
+        del tagger
+    gc.collect()
+    tagger = nagisa.Tagger(engine=engine)
+    t = timer()
+    nagisa.Tagger(engine=engine)
+    shared = timer() - t
+    load.sort()
+    return {'load_median_s': load[len(load)//2], 'load_min_s': load[0],
+            'shared_s': shared, 'repeat': repeat}
+
+
+def compare(results, baseline):
+    """Return the ratio of the throughput of each stage to the baseline (> 1 is faster)."""
+    ratios = {}
+    for name, corpus in results['corpora'].items():
+        old = baseline.get('corpora', {}).get(name)
+        if old is None:
+            continue
+        for stage, r in corpus['stages'].items():
+            old_r = old['stages'].get(stage)
+            if old_r and old_r.get('chars_per_s') and r.get('chars_per_s'):
+                ratios['{}/{}'.format(name, stage)] = r['chars_per_s'] / old_r['chars_per_s']
+    return ratios
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Pipeline benchmark of nagisa.')
+    parser.add_argument('--engine', type=str, default='dynet', help="'dynet' or 'numpy'.")
+    parser.add_argument('--mixes', type=str, nargs='*', default=sorted(MIXES),
+                        help='The script mixes of the generated corpora.')
+    parser.add_argument('--lengths', type=int, nargs='*', default=[10, 50, 200],
+                        help='The sentence lengths of the generated corpora.')
+    parser.add_argument('--num', type=int, default=100,
+                        help='The number of sentences of a corpus.')
+    parser.add_argument('--stages', type=str, nargs='*', default=STAGES, choices=STAGES)
+    parser.add_argument('--repeat', type=int, default=3, help='The number of repeats.')
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no_sample', action='store_true',
+                        help='Do not use the bundled sample_datasets.')
+    parser.add_argument('--no_import', action='store_true',
+                        help='Do not measure the import time.')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='A previous output JSON file to compare with.')
+    parser.add_argument('--output', type=str, default=None, help='Output JSON file.')
+    args = parser.parse_args()
+
+    corpora = {}
+    if not args.no_sample:
+        corpora['sample'] = load_sample_corpus(args.num)
+    for mix in args.mixes:
+        for length in args.lengths:
+            corpora['{}_{}'.format(mix, length)] = generate_corpus(args.num, length, mix,
+                                                                   args.seed)
+
+    results = {'meta': {'engine': args.engine, 'nagisa': nagisa.version,
+                        'python': platform.python_version(), 'numpy': np.__version__,
+                        'platform': platform.platform(), 'time': time.time(),
+                        'num': args.num, 'repeat': args.repeat}}
+    results['construction'] = bench_construction(args.engine, args.repeat)
+    tagger = nagisa.Tagger(engine=args.engine)
+    results['corpora'] = {name: bench_corpus(tagger, texts, args.repeat, args.stages,
+                                             args.batch_size)
+                          for name, texts in sorted(corpora.items())}
+    if not args.no_import:
+        import bench_import
+        # The startup time of the interpreter is subtracted as in bench_import.py.
+        startup = bench_import.measure('pass', args.repeat)['median_s']
+        results['import'] = {'python_startup_s': startup}
+        for name, code in bench_import.CASES:
+            r = bench_import.measure(code, args.repeat)
+            r['median_s'] -= startup
+            r['min_s'] -= startup
+            results['import'][name] = r
+    try:
+        import resource
+        results['meta']['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        pass
+    if args.baseline:
+        with open(args.baseline) as f:
+            results['speedup'] = compare(results, json.load(f))
+
+    out = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+    print(out)
@@ -0,0 +1,68 @@
+# -*- coding:utf-8 -*-
+
+"""Measure the throughput of the Viterbi decoder for inputs of several lengths.
+
+The observations are computed once by the model, and only decoding is timed.
+The median of the repeats is written as JSON.
+
+    $ python benchmarks/bench_viterbi.py --repeat 5
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import sys
+import json
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import nagisa
+import nagisa_utils as utils
+
+
+TEXT = u'Pythonで簡単に使えるツールです。東京都に住んでいます。'
+LENGTHS = [10, 100, 1000, 10000, 100000]
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.time()
+        func()
+        times.append(time.time() - t)
+    times.sort()
+    return times[len(times)//2]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Viterbi decoder benchmark of nagisa.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of repeats.')
+    parser.add_argument('--batch', type=int, default=32,
+                        help='The number of sentences decoded by viterbi_batch.')
+    parser.add_argument('--output', type=str, default=None, help='Output JSON file.')
+    args = parser.parse_args()
+
+    tagger = nagisa.Tagger(engine='numpy')
+    trans = tagger._model.trans_array
+
+    results = {}
+    for length in LENGTHS:
+        text = (TEXT * (length // len(TEXT) + 1))[:length]
+        obs = tagger._model.ws_observations(tagger._feature_extraction(text))
+        single_s = measure(lambda: utils.np_viterbi(trans, obs), args.repeat)
+        obs_list = [obs] * args.batch
+        batch_s = measure(lambda: utils.viterbi_batch(trans, obs_list), args.repeat)
+        results[str(length)] = {'np_viterbi_s': single_s,
+                                'np_viterbi_chars_per_s': length / single_s,
+                                'viterbi_batch_s': batch_s,
+                                'viterbi_batch_chars_per_s': length * args.batch / batch_s}
+
+    out = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+    print(out)
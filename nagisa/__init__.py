@@ -1,18 +1,130 @@
-import nagisa_utils as utils
-
-from nagisa.tagger import Tagger
-from nagisa.train import fit
+import os
+import sys
+import types
+import inspect
+import functools
+import importlib
+import threading
 
 version = '0.2.11'
-# Initialize instance
-tagger  = Tagger()
+
+# nagisa.train imports prepro and mecab_system_eval from this directory.
+_base = os.path.dirname(os.path.abspath(__file__))
+if _base not in sys.path:
+    sys.path.append(_base)
+
+# The default tagger is built on first use, so that importing nagisa
+# does not load the model (and DyNet) in processes which do not need it.
+_tagger = None
+_tagger_lock = threading.Lock()
+
+
+def _get_tagger():
+    global _tagger
+    if _tagger is None:
+        # The lock is held while the tagger is built,
+        # so that two threads do not build it.
+        with _tagger_lock:
+            if _tagger is None:
+                _tagger = _tagger_class()()
+    return _tagger
+
+
+def _tagger_class():
+    return globals().get('Tagger') or _load('Tagger')
+
+
+def _delegate(name):
+    method = getattr(_tagger_class(), name)
+
+    @functools.wraps(method)
+    def func(*args, **kwargs):
+        return getattr(_get_tagger(), name)(*args, **kwargs)
+
+    # The signature of the function is that of the bound method (without self).
+    if hasattr(inspect, 'signature'):
+        sig = inspect.signature(method)
+        func.__signature__ = sig.replace(parameters=list(sig.parameters.values())[1:])
+    return func
+
+
 # Functions
-wakati  = tagger.wakati
-tagging = tagger.tagging
-filter  = tagger.filter
-extract = tagger.extract
-postagging = tagger.postagging
-decode = tagger.decode
-fit = fit
+_DELEGATES = ['wakati', 'tagging', 'wakati_batch', 'tagging_batch', 'tagging_many',
+              'tagging_spans', 'tagging_spans_batch', 'filter', 'extract',
+              'postagging', 'decode']
+
+# The attributes which are imported when they are used first, so that
+# importing a light module (e.g., nagisa.client) does not import NumPy.
+_IMPORTS = {'Tagger': ('nagisa.tagger', 'Tagger'),
+            'fit': ('nagisa.train', 'fit'),
+            'utils': ('nagisa_utils', None)}
+
+
+def _is_submodule(name):
+    return (not name.startswith('_') and name != 'tagger' and
+            os.path.exists(os.path.join(_base, name + '.py')))
+
+
+def _load(name):
+    if name in _DELEGATES:
+        value = _delegate(name)
+    elif name not in _IMPORTS:
+        # A submodule (e.g., nagisa.train) is imported when it is used first.
+        value = importlib.import_module('nagisa.' + name)
+    else:
+        module, attr = _IMPORTS[name]
+        value = importlib.import_module(module)
+        if attr is not None:
+            value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
+
+class _LazyTagger(object):
+    """The default tagger on Python 2, which is built when it is used first."""
+
+    def __getattr__(self, name):
+        return getattr(_get_tagger(), name)
+
+    def __repr__(self):
+        return repr(_get_tagger())
+
+
+class _Module(types.ModuleType):
+    """The nagisa module, whose attributes in _DELEGATES and _IMPORTS are loaded
+    when they are used first.
+    """
+
+    def __getattr__(self, name):
+        if name in _DELEGATES or name in _IMPORTS or _is_submodule(name):
+            return _load(name)
+        raise AttributeError("module 'nagisa' has no attribute '{}'".format(name))
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_DELEGATES) | set(_IMPORTS) | {'tagger'})
+
+    # nagisa.tagger is the default tagger, which is built when it is used first.
+    # It is kept when the submodule nagisa.tagger is imported (which sets the
+    # attribute of the package), and it can be replaced by another Tagger.
+    @property
+    def tagger(self):
+        return _get_tagger()
+
+    @tagger.setter
+    def tagger(self, value):
+        global _tagger
+        if not isinstance(value, types.ModuleType):
+            with _tagger_lock:
+                _tagger = value
+
+
+if sys.version_info >= (3, 5):
+    sys.modules[__name__].__class__ = _Module
+else:
+    # The class of a module cannot be changed.
+    for _name in list(_IMPORTS) + _DELEGATES:
+        _load(_name)
+    # Initialize instance
+    tagger = _LazyTagger()
 
 __version__ = version
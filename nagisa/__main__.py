@@ -0,0 +1,27 @@
+# -*- coding:utf-8 -*-
+"""
+    $ python -m nagisa [options] [files]   # see nagisa.cli
+    $ python -m nagisa serve [options]     # see nagisa.server
+    $ python -m nagisa client [options]    # see nagisa.client
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import sys
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'serve':
+        import nagisa.server as server
+        return server.main(argv[1:])
+    if argv and argv[0] == 'client':
+        import nagisa.client as client
+        return client.main(argv[1:])
+    import nagisa.cli as cli
+    return cli.main(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+# -*- coding:utf-8 -*-
+"""
+An asyncio front end of the Tagger, which tags the concurrent requests together.
+
+    >>> from nagisa.async_tagger import AsyncTagger
+    >>> async_tagger = AsyncTagger(max_delay=0.005)
+    >>> words = await async_tagger.tagging('Pythonで簡単に使えるツールです')
+
+This module requires Python 3.5 or later.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import asyncio
+import concurrent.futures
+
+from nagisa.tagger import Tagger
+
+
+class AsyncTagger(object):
+    """
+    The requests which arrive within max_delay seconds are collected into a group,
+    and the group is tagged as minibatches in a worker thread, so the event loop
+    is not blocked. A group is tagged as soon as it has max_batch_size sentences
+    or max_chars characters, so the latency of a request is bounded by max_delay
+    and the time of tagging one group.
+
+    args:
+        - tagger (Tagger, optional): The tagger to use. The default is a new \
+                                     Tagger() (which shares the default model).
+        - max_delay (float, optional): The maximum seconds a request waits for other requests.
+        - max_batch_size (int, optional): The maximum number of sentences in a group.
+        - max_chars (int, optional): The maximum number of characters in a group.
+        - batch_size (int, optional): The maximum number of sentences in a minibatch.
+        - executor (concurrent.futures.Executor, optional): The executor running \
+                                                            the tagger. The default \
+                                                            is a single thread, since \
+                                                            a Tagger is not thread-safe.
+    """
+
+    def __init__(self, tagger=None, max_delay=0.005, max_batch_size=64, max_chars=8192,
+                 batch_size=32, executor=None):
+        if max_delay < 0:
+            raise ValueError("max_delay must be a non-negative number.")
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be a positive integer.")
+        if tagger is None:
+            tagger = Tagger()
+        self.tagger = tagger
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+
+        self._own_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._executor = executor
+
+        # The pending requests of each (method, lower),
+        # and the groups being tagged.
+        self._groups = {}
+        self._running = set()
+        self._num_requests = 0
+        self._num_groups = 0
+
+    async def tagging(self, text, lower=False):
+        """Return the words with POS-tags of the sentence (see Tagger.tagging)."""
+        return await self._submit('tagging_batch', text, lower)
+
+    async def wakati(self, text, lower=False):
+        """Return the segmented words of the sentence (see Tagger.wakati)."""
+        return await self._submit('wakati_batch', text, lower)
+
+    async def tagging_spans(self, text, lower=False):
+        """Return the spans of the words of the sentence (see Tagger.tagging_spans)."""
+        return await self._submit('tagging_spans_batch', text, lower)
+
+    def info(self):
+        """Return the numbers of the requests and the groups tagged so far."""
+        return {'requests': self._num_requests, 'groups': self._num_groups}
+
+    async def close(self):
+        """Wait for the pending requests, and shut down the default executor."""
+        for key in list(self._groups):
+            self._flush(key)
+        if self._running:
+            await asyncio.wait(list(self._running))
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    def _submit(self, method, text, lower):
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        key = (method, lower)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Group(loop.call_later(self.max_delay,
+                                                               self._flush, key))
+        group.texts.append(text)
+        group.futures.append(future)
+        group.num_chars += len(text)
+        self._num_requests += 1
+        if (len(group.texts) >= self.max_batch_size or
+                group.num_chars >= self.max_chars):
+            self._flush(key)
+        return future
+
+    def _flush(self, key):
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        group.timer.cancel()
+        self._num_groups += 1
+        method, lower = key
+        loop = asyncio.get_event_loop()
+        done = loop.run_in_executor(self._executor, _tag_group, getattr(self.tagger, method),
+                                    group.texts, lower, self.batch_size)
+        self._running.add(done)
+        done.add_done_callback(self._running.discard)
+        done.add_done_callback(lambda done: _resolve(group.futures, done))
+
+
+class _Group(object):
+    __slots__ = ('texts', 'futures', 'num_chars', 'timer')
+
+    def __init__(self, timer):
+        self.texts = []
+        self.futures = []
+        self.num_chars = 0
+        self.timer = timer
+
+
+def _tag_group(tag_batch, texts, lower, batch_size):
+    # If a sentence of the group raises an error, the sentences are tagged
+    # one by one, so that the error is returned only to its caller.
+    try:
+        return [(result, None) for result in tag_batch(texts, lower, batch_size)]
+    except Exception:
+        results = []
+        for text in texts:
+            try:
+                results.append((tag_batch([text], lower, batch_size)[0], None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+
+def _resolve(futures, done):
+    # The callers which have been cancelled are skipped.
+    if done.cancelled():
+        for future in futures:
+            future.cancel()
+        return
+    error = done.exception()
+    for i, future in enumerate(futures):
+        if future.done():
+            continue
+        if error is not None:
+            future.set_exception(error)
+            continue
+        result, e = done.result()[i]
+        if e is not None:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
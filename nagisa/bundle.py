@@ -0,0 +1,246 @@
+# -*- coding:utf-8 -*-
+"""
+A model bundle stores the vocabularies, the parameters and the hyper-parameters
+of a model in one binary file, which the Tagger memory-maps.
+
+    $ python -m nagisa.bundle --output nagisa_v001.nagisa
+    $ python -m nagisa.bundle --vocabs sample.vocabs --params sample.params \\
+        --hp sample.hp --output sample.nagisa
+
+    >>> tagger = nagisa.Tagger(bundle='sample.nagisa')
+
+The layout of a file is:
+
+    - magic (8 bytes): b'NAGISA\\x00B'
+    - version (uint32, little-endian)
+    - header size (uint32, little-endian)
+    - header (UTF-8 JSON): the hyper-parameters and the name, dtype, \
+      shape and offset of each array
+    - the arrays, raw little-endian data aligned to 64 bytes
+
+The vocabularies are stored as the arrays of StringTable, and the trie of the
+words and the character tables are stored as well, so that nothing is built
+when a model is loaded. The processes loading the same file share its pages.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import json
+import mmap
+import struct
+
+import numpy as np
+
+import nagisa_utils as utils
+import nagisa.np_model as np_model
+
+
+MAGIC   = b'NAGISA\x00B'
+VERSION = 1
+
+_PREAMBLE  = struct.Struct('<8sII')
+_ALIGNMENT = 64
+_VOCAB_NAMES = ['uni2id', 'bi2id', 'word2id', 'pos2id', 'word2postags']
+
+
+class Bundle(object):
+    """The contents of a model bundle (see load()).
+
+    attributes:
+        - hp (dict): The hyper-parameters.
+        - vocabs (list): The vocabularies as StringTable in the order of a vocabulary file.
+        - arrays (dict): The arrays of the model (see np_model.export_arrays).
+        - word_index (tuple): The arrays of the WordIndex of word2id.
+        - char_table (tuple): The arrays of the CharTable of uni2id and bi2id.
+    """
+
+    def __init__(self, hp, vocabs, arrays, word_index, char_table):
+        self.hp = hp
+        self.vocabs = vocabs
+        self.arrays = arrays
+        self.word_index = word_index
+        self.char_table = char_table
+
+
+def write(fn, hp, arrays):
+    """Write the hyper-parameters and the named arrays into a file.
+
+    args:
+        - fn (str): Path to an output file.
+        - hp (dict): The hyper-parameters. They must be serializable as JSON.
+        - arrays (dict): The arrays to store.
+    """
+    entries = []
+    data = []
+    offset = 0
+    for name in sorted(arrays):
+        array = np.asarray(arrays[name])
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+        offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+        entries.append([name, array.dtype.str, list(array.shape), offset])
+        data.append((offset, array))
+        offset += array.nbytes
+
+    header = json.dumps({'hp': hp, 'arrays': entries}, sort_keys=True).encode('utf-8')
+    start = -(-(_PREAMBLE.size + len(header)) // _ALIGNMENT) * _ALIGNMENT
+    tmp = fn + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for offset, array in data:
+            f.write(b'\0' * (start + offset - f.tell()))
+            f.write(array.tobytes())
+    # The file is replaced atomically, so a process never reads a partial bundle.
+    _replace(tmp, fn)
+
+
+def _replace(src, dst):
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+        return
+    # Python 2: os.rename overwrites dst atomically on POSIX, but not on Windows.
+    if os.name == 'nt' and os.path.exists(dst):
+        os.remove(dst)
+    os.rename(src, dst)
+
+
+def read(fn):
+    """Memory-map a file written by write().
+
+    args:
+        - fn (str): Path to a bundle file.
+
+    return:
+        - dict : The hyper-parameters.
+        - dict : The read-only arrays backed by the memory-mapped file.
+    """
+    with open(fn, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError('{} is not a nagisa model bundle.'.format(fn))
+        magic, version, header_size = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError('{} is not a nagisa model bundle.'.format(fn))
+        if version > VERSION:
+            raise ValueError('{} is a bundle of version {}, which is not supported '
+                             'by this version of nagisa.'.format(fn, version))
+        header = json.loads(f.read(header_size).decode('utf-8'))
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    start = -(-(_PREAMBLE.size + header_size) // _ALIGNMENT) * _ALIGNMENT
+    arrays = {}
+    for name, dtype, shape, offset in header['arrays']:
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        array = np.frombuffer(buf, dtype=dtype, count=count, offset=start + offset)
+        arrays[name] = array.reshape(tuple(shape))
+    return header['hp'], arrays
+
+
+def is_bundle(fn):
+    """Return True if fn is a model bundle."""
+    with open(fn, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def convert(vocabs, params, hp, output):
+    """Convert the files of a model into a bundle.
+
+    args:
+        - vocabs (str): Path to a vocabulary file (*.vocabs).
+        - params (str): Path to a model parameter file (*.params), or a quantized \
+                        model file (see nagisa.quantize).
+        - hp (str): Path to a hyper-parameter file (*.hp).
+        - output (str): Path to an output file.
+
+    return:
+        - str : The path to the output file.
+    """
+    hp = dict(utils.load_data(hp))
+    vocabs = utils.load_data(vocabs)
+    arrays = {}
+    for name, vocab in zip(_VOCAB_NAMES, vocabs):
+        table = utils.StringTable.from_dict(vocab)
+        arrays[name+'/keys'] = table.keys_data
+        arrays[name+'/key_offsets'] = table.key_offsets
+        arrays[name+'/values'] = table.values
+        if table.value_offsets is not None:
+            arrays[name+'/value_offsets'] = table.value_offsets
+
+    word_index = utils.WordIndex(vocabs[2])
+    arrays['word_index/oov_id'] = np.array([word_index.oov_id], dtype=np.int32)
+    for name in ['edge_start', 'edge_chars', 'edge_targets', 'word_ids']:
+        arrays['word_index/'+name] = getattr(word_index, name)
+
+    char_table = utils.CharTable(vocabs[0], vocabs[1])
+    arrays['char_table/oov_ids'] = np.array([char_table.uni_oov, char_table.bi_oov],
+                                            dtype=np.int32)
+    for name in ['uni_ids', 'bi_keys', 'bi_values']:
+        arrays['char_table/'+name] = getattr(char_table, name)
+
+    for name, array in np_model.load_arrays(hp, params).items():
+        if isinstance(array, np_model.QuantizedTable):
+            arrays['params/'+name+'.q'] = array.q
+            arrays['params/'+name+'.scale'] = array.scale
+        else:
+            arrays['params/'+name] = array
+
+    write(output, hp, arrays)
+    return output
+
+
+def load(fn):
+    """Load a model bundle. The arrays are memory-mapped.
+
+    args:
+        - fn (str): Path to a bundle file.
+
+    return:
+        - Bundle : The contents of the bundle.
+    """
+    hp, arrays = read(fn)
+    vocabs = []
+    for name in _VOCAB_NAMES:
+        vocabs.append(utils.StringTable(arrays[name+'/keys'], arrays[name+'/key_offsets'],
+                                        arrays[name+'/values'],
+                                        arrays.get(name+'/value_offsets')))
+
+    word_index = (int(arrays['word_index/oov_id'][0]),) + tuple(
+        arrays['word_index/'+name]
+        for name in ['edge_start', 'edge_chars', 'edge_targets', 'word_ids'])
+    uni_oov, bi_oov = arrays['char_table/oov_ids'].tolist()
+    char_table = (uni_oov, bi_oov) + tuple(
+        arrays['char_table/'+name] for name in ['uni_ids', 'bi_keys', 'bi_values'])
+
+    params = {}
+    for key, array in arrays.items():
+        if not key.startswith('params/') or key.endswith('.scale'):
+            continue
+        name = key[len('params/'):]
+        if name.endswith('.q'):
+            name = name[:-len('.q')]
+            array = np_model.QuantizedTable(array, arrays['params/'+name+'.scale'])
+        params[name] = array
+    return Bundle(hp, vocabs, params, word_index, char_table)
+
+
+def main(argv=None):
+    import argparse
+
+    base = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--vocabs', type=str, default=base+'/data/nagisa_v001.dict',
+                        help='Path to a vocabulary file (default: the bundled model)')
+    parser.add_argument('--params', type=str, default=base+'/data/nagisa_v001.model',
+                        help='Path to a model parameter file (default: the bundled model)')
+    parser.add_argument('--hp', type=str, default=base+'/data/nagisa_v001.hp',
+                        help='Path to a hyper-parameter file (default: the bundled model)')
+    parser.add_argument('--output', type=str, required=True,
+                        help='Path to the bundle file')
+    args = parser.parse_args(argv)
+    convert(args.vocabs, args.params, args.hp, args.output)
+
+
+if __name__ == '__main__':
+    main()
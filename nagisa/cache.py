@@ -0,0 +1,274 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    This class is a bounded cache which discards the least recently used entry first.
+    It counts the hits, the misses and the evictions.
+    """
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+
+    def get(self, key, default=None):
+        """Return the value of the key, or default if the key is not cached."""
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # Move the key to the most recently used position.
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+
+    def put(self, key, value):
+        """Add the key and its value, and discard the least recently used entry if full."""
+        if key in self._data:
+            del self._data[key]
+        elif len(self._data) >= self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        self._data[key] = value
+
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def info(self):
+        """Return the counters and the size of the cache as a dict."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize}
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class SQLiteCache(object):
+    """
+    This class is a persistent cache stored in a SQLite database.
+    It can be shared by multiple processes and runs.
+    The entries of different models are separated by the model fingerprint,
+    and the least recently used entries are evicted when the cache is full.
+
+    args:
+        - path (str): Path to a database file. It is created if it does not exist.
+        - fingerprint (str): The fingerprint of the model (see model_fingerprint).
+        - max_entries (int, optional): The maximum number of entries in the database.
+        - timeout (float, optional): Seconds to wait for the lock held by another process.
+    """
+
+    # The number of writes between the checks of the size of the database.
+    check_interval = 1000
+
+    def __init__(self, path, fingerprint, max_entries=None, timeout=30.0):
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("max_entries must be a positive integer.")
+        self.path = path
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._touched = set()
+        self._conn = None
+        self._pid = None
+
+
+    def _connect(self):
+        # A connection must not be shared with a forked process.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'fingerprint TEXT NOT NULL, key TEXT NOT NULL, '
+                         'value TEXT NOT NULL, atime REAL NOT NULL, '
+                         'PRIMARY KEY (fingerprint, key))')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)')
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+
+    def get(self, key, default=None):
+        """Return the value of the key, or default if the key is not cached."""
+        return self.get_many([key], default)[0]
+
+
+    def get_many(self, keys, default=None):
+        """Return the values of the keys in the same order."""
+        conn = self._connect()
+        values = []
+        for key in keys:
+            row = conn.execute('SELECT value FROM entries WHERE fingerprint=? AND key=?',
+                               (self.fingerprint, _dumps(key))).fetchone()
+            if row is None:
+                self.misses += 1
+                values.append(default)
+            else:
+                self.hits += 1
+                self._touched.add(_dumps(key))
+                values.append(json.loads(row[0]))
+        return values
+
+
+    def put(self, key, value):
+        """Add the key and its value."""
+        self.put_many([(key, value)])
+
+
+    def put_many(self, items):
+        """Add the pairs of the keys and the values in one transaction."""
+        conn = self._connect()
+        now = time.time()
+        rows = [(self.fingerprint, _dumps(key), _dumps(value), now) for key, value in items]
+        touched = [(now, self.fingerprint, key) for key in self._touched]
+        self._touched = set()
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', rows)
+            conn.executemany('UPDATE entries SET atime=? WHERE fingerprint=? AND key=?',
+                             touched)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._writes += len(rows)
+        if self.max_entries is not None and self._writes >= self.check_interval:
+            self._writes = 0
+            self.evict()
+
+
+    def warm(self, items):
+        """Add the pairs of the keys and the values in bulk."""
+        self.put_many(items)
+        if self.max_entries is not None:
+            self.evict()
+
+
+    def evict(self):
+        """Remove the least recently used entries beyond max_entries."""
+        if self.max_entries is None:
+            return
+        conn = self._connect()
+        num_entries = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        num_evictions = num_entries - self.max_entries
+        if num_evictions > 0:
+            conn.execute('DELETE FROM entries WHERE rowid IN '
+                         '(SELECT rowid FROM entries ORDER BY atime LIMIT ?)',
+                         (num_evictions,))
+            self.evictions += num_evictions
+
+
+    def flush(self):
+        """Write the access times of the hit entries, which are used for the eviction."""
+        if self._touched:
+            self.put_many([])
+
+
+    def clear(self):
+        """Remove all entries of this fingerprint and reset the counters."""
+        conn = self._connect()
+        conn.execute('DELETE FROM entries WHERE fingerprint=?', (self.fingerprint,))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._touched = set()
+
+
+    def close(self):
+        self.flush()
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+    def info(self):
+        """Return the counters of this process and the size of the cache as a dict."""
+        conn = self._connect()
+        size = conn.execute('SELECT COUNT(*) FROM entries WHERE fingerprint=?',
+                            (self.fingerprint,)).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': size,
+                'maxsize': self.max_entries}
+
+
+    def __len__(self):
+        return self.info()['size']
+
+
+def model_fingerprint(vocabs, params, hp, single_word_list=None, options=None):
+    """Return a hash of the model files, the single_word_list and the options.
+
+    args:
+        - vocabs (str): Path to a vocabulary file.
+        - params (str): Path to a model parameter file.
+        - hp (str): Path to a hyper-parameter file.
+        - single_word_list (list, optional): The words recognized as a single word forcibly.
+        - options (dict, optional): The other options of the tagger \
+                                    which change the results (e.g., max_word_length).
+
+    A model bundle is given as vocabs, with params and hp set to None.
+
+    return:
+        - str : The hexadecimal digest.
+    """
+    h = hashlib.sha1()
+    for fn in [vocabs, params, hp]:
+        if fn is None:
+            continue
+        with open(fn, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        h.update(b'\0')
+    h.update(_dumps(list(single_word_list or [])).encode('utf-8'))
+    if options:
+        h.update(b'\0')
+        h.update(_dumps(sorted(options.items())).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
@@ -0,0 +1,182 @@
+# -*- coding:utf-8 -*-
+"""
+Tag the lines of the files (or stdin) and write one result per line.
+
+    $ python -m nagisa corpus.txt.gz --format wakati > corpus.wakati
+    $ cat corpus.txt | python -m nagisa --format mecab --n_jobs 4 > corpus.mecab
+
+The output formats are:
+
+    wakati  : The words separated by spaces.
+    wordpos : The words with POS-tags (word/POS) separated by spaces.
+    mecab   : A line of word<TAB>POS for each word, and EOS after each
+              sentence (the format read by nagisa.mecab_system_eval).
+    jsonl   : A JSON object {"text", "words", "postags", "offsets"} for each
+              line. The words are the surfaces in the line, and the offsets
+              are their (start, end) character positions.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import io
+import sys
+import json
+import errno
+import importlib
+
+import nagisa.parallel as parallel
+from nagisa.tagger import Tagger
+
+FORMATS = ['wakati', 'wordpos', 'mecab', 'jsonl']
+
+# The magic numbers of the compressed files and the modules reading them.
+_COMPRESSIONS = [(b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'lzma')]
+
+
+def open_input(filename, encoding='utf_8_sig'):
+    """Open a text file, which can be compressed with gzip, bzip2 or xz.
+
+    args:
+        - filename (str): Path to an input file, or '-' for stdin.
+        - encoding (str): The encoding of the text.
+
+    return:
+        - file : The text file object.
+    """
+    if filename == '-':
+        stdin = sys.stdin.buffer if hasattr(sys.stdin, 'buffer') else sys.stdin
+        raw = io.BufferedReader(io.FileIO(stdin.fileno(), 'rb', closefd=False))
+    else:
+        raw = io.open(filename, 'rb')
+    # The compression is detected from the content, so that stdin can be compressed.
+    head = raw.peek(6)[:6]
+    for magic, module in _COMPRESSIONS:
+        if head.startswith(magic):
+            if filename != '-':
+                # The compressed file is closed with the text file.
+                raw.close()
+                raw = filename
+            raw = importlib.import_module(module).open(raw, 'rb')
+            break
+    return io.TextIOWrapper(raw, encoding=encoding)
+
+
+def read_lines(filenames, encoding='utf_8_sig'):
+    """Yield the lines of the files (without the newlines) lazily."""
+    for filename in filenames:
+        f = open_input(filename, encoding)
+        try:
+            for line in f:
+                yield line.rstrip('\r\n')
+        finally:
+            f.close()
+
+
+def format_chunk(tagger, texts, format='wordpos', lower=False, batch_size=32):
+    """Tag the sentences and return the output of the format as a string.
+
+    args:
+        - tagger (Tagger): The tagger.
+        - texts (list): Input sentences.
+        - format (str): One of FORMATS.
+        - lower (bool): If lower is True, all uppercase characters in a list \
+                        of the words are converted into lowercase characters.
+        - batch_size (int): The maximum number of sentences in a minibatch.
+
+    return:
+        - str : The output lines.
+    """
+    if format == 'wakati':
+        return ''.join([' '.join(words) + '\n'
+                        for words in tagger.wakati_batch(texts, lower, batch_size)])
+    elif format == 'jsonl':
+        lines = []
+        for text, spans in zip(texts, tagger.tagging_spans_batch(texts, lower, batch_size)):
+            obj = {'text': text, 'words': spans.words, 'postags': spans.postags,
+                   'offsets': spans.offsets.tolist()}
+            lines.append(json.dumps(obj, ensure_ascii=False) + '\n')
+        return ''.join(lines)
+
+    tokens = tagger.tagging_batch(texts, lower, batch_size)
+    if format == 'wordpos':
+        return ''.join([str(token) + '\n' for token in tokens])
+    elif format == 'mecab':
+        lines = []
+        for token in tokens:
+            lines += [w + '\t' + p + '\n' for w, p in zip(token.words, token.postags)]
+            lines.append('EOS\n')
+        return ''.join(lines)
+    raise ValueError('format must be one of {}.'.format(', '.join(FORMATS)))
+
+
+def add_model_arguments(parser):
+    """Add the options of the model and the user dictionary to an ArgumentParser."""
+    parser.add_argument('--vocabs', type=str, help='Path to a vocabulary file (*.vocabs)')
+    parser.add_argument('--params', type=str, help='Path to a model parameter file (*.params)')
+    parser.add_argument('--hp', type=str, help='Path to a hyper-parameter file (*.hp)')
+    parser.add_argument('--bundle', type=str, help='Path to a model bundle (*.nagisa)')
+    parser.add_argument('--engine', type=str, default='dynet', choices=['dynet', 'numpy'])
+    parser.add_argument('--single_word_list', type=str, default=None,
+                        help='Path to a user dictionary, a file of the words '
+                             '(or regular expressions) recognized as a single word')
+
+
+def build_tagger(args):
+    """Return the Tagger of the options added by add_model_arguments()."""
+    single_word_list = None
+    if args.single_word_list is not None:
+        with io.open(args.single_word_list, encoding='utf_8_sig') as f:
+            single_word_list = [line.strip() for line in f if line.strip()]
+    return Tagger(vocabs=args.vocabs, params=args.params, hp=args.hp, bundle=args.bundle,
+                  engine=args.engine, single_word_list=single_word_list)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m nagisa',
+                                     description=__doc__.strip().split('\n')[0],
+                                     epilog='See also: python -m nagisa {serve,client} -h')
+    parser.add_argument('files', nargs='*', default=['-'],
+                        help='Input files, which can be compressed (the default is stdin)')
+    parser.add_argument('-f', '--format', type=str, default='wordpos', choices=FORMATS)
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Output file (the default is stdout)')
+    parser.add_argument('--encoding', type=str, default='utf_8_sig')
+    parser.add_argument('--lower', action='store_true')
+    parser.add_argument('-j', '--n_jobs', type=int, default=1,
+                        help='The number of worker processes')
+    parser.add_argument('--chunk_size', type=int, default=256,
+                        help='The number of lines tagged at a time')
+    parser.add_argument('--batch_size', type=int, default=32)
+    add_model_arguments(parser)
+    args = parser.parse_args(argv)
+
+    tagger = build_tagger(args)
+    if args.output is None:
+        stdout = sys.stdout.buffer if hasattr(sys.stdout, 'buffer') else sys.stdout
+        out = io.BufferedWriter(io.FileIO(stdout.fileno(), 'wb', closefd=False), 1 << 16)
+    else:
+        out = io.open(args.output, 'wb')
+
+    lines = read_lines(args.files, args.encoding)
+    chunks = parallel.map_chunks(tagger, lines, format_chunk,
+                                 (args.format, args.lower, args.batch_size),
+                                 n_jobs=args.n_jobs, chunk_size=args.chunk_size)
+    try:
+        # The output of a chunk is written at once.
+        for _, output in chunks:
+            out.write(output.encode('utf-8'))
+        out.close()
+    except IOError as e:
+        # The output is closed by the reader (e.g., head).
+        if e.errno != errno.EPIPE:
+            raise
+        return 1
+    finally:
+        chunks.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
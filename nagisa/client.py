@@ -0,0 +1,209 @@
+# -*- coding:utf-8 -*-
+"""
+A client of the nagisa server (see nagisa.server), which tags the sentences
+with a model kept loaded by the server over a Unix domain socket.
+
+    $ python -m nagisa serve &
+    $ cat corpus.txt | python -m nagisa client --format wakati
+
+A message is a 4-byte big-endian length followed by a UTF-8 JSON object.
+A request is {"method": ..., "texts": [...], "lower": ..., "model": ...},
+where the method is 'wakati', 'tagging' or 'info', and the response is
+{"results": [...]} or {"error": "message"}. The result of 'tagging'
+is a pair of the words and the POS-tags of each sentence.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import io
+import os
+import sys
+import json
+import socket
+import struct
+import tempfile
+import itertools
+
+from nagisa.tokens import Token
+
+_HEADER = struct.Struct('>I')
+
+# The maximum size of a message (bytes).
+MAX_MESSAGE_SIZE = 1 << 28
+
+
+def default_socket_path():
+    """Return $NAGISA_SOCKET, or the socket path of this user in the temporary directory."""
+    path = os.environ.get('NAGISA_SOCKET')
+    if path:
+        return path
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(tempfile.gettempdir(), 'nagisa-{}.sock'.format(uid))
+
+
+def send_message(sock, obj):
+    data = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    """Return the next message of the socket, or None if the socket is closed."""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    size = _HEADER.unpack(header)[0]
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError('The message is too large ({} bytes).'.format(size))
+    data = _recv_exactly(sock, size)
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
+
+
+class ServerError(Exception):
+    """An error returned by the server."""
+
+
+class Client(object):
+    """
+    A connection to the nagisa server. The methods are the same as those of Tagger.
+
+    args:
+        - path (str, optional): Path to the socket of the server. \
+                                The default is default_socket_path().
+        - model (str, optional): The name of the model of the server.
+        - timeout (float, optional): The timeout of the socket (seconds).
+        - chunk_size (int, optional): The maximum number of sentences in a request.
+    """
+
+    def __init__(self, path=None, model='default', timeout=None, chunk_size=256):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer.")
+        self.path = path if path is not None else default_socket_path()
+        self.model = model
+        self.chunk_size = chunk_size
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(self.path)
+        except socket.error:
+            self._sock.close()
+            raise
+
+    def _request(self, method, texts=None, lower=False):
+        send_message(self._sock, {'method': method, 'texts': texts,
+                                  'lower': lower, 'model': self.model})
+        response = recv_message(self._sock)
+        if response is None:
+            raise ServerError('The server closed the connection.')
+        if 'error' in response:
+            raise ServerError(response['error'])
+        return response['results']
+
+    def _request_many(self, method, texts, lower):
+        texts = list(texts)
+        results = []
+        for i in range(0, len(texts), self.chunk_size):
+            results += self._request(method, texts[i:i+self.chunk_size], lower)
+        return results
+
+    def wakati(self, text, lower=False):
+        """Return the segmented words of the sentence (see Tagger.wakati)."""
+        return self._request('wakati', [text], lower)[0]
+
+    def wakati_batch(self, texts, lower=False):
+        """Return the segmented words of the sentences (see Tagger.wakati_batch)."""
+        return self._request_many('wakati', texts, lower)
+
+    def tagging(self, text, lower=False):
+        """Return the words with POS-tags of the sentence (see Tagger.tagging)."""
+        return self.tagging_batch([text], lower)[0]
+
+    def tagging_batch(self, texts, lower=False):
+        """Return the words with POS-tags of the sentences (see Tagger.tagging_batch)."""
+        texts = list(texts)
+        results = self._request_many('tagging', texts, lower)
+        return [Token(text, lower, None, None, _words=words, _postags=postags)
+                for text, (words, postags) in zip(texts, results)]
+
+    def info(self):
+        """Return the models and the counters of the server."""
+        return self._request('info')
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _read_lines(files):
+    if not files:
+        stdin = sys.stdin.buffer if hasattr(sys.stdin, 'buffer') else sys.stdin
+        files = [io.TextIOWrapper(stdin, encoding='utf-8')]
+    for f in files:
+        if not hasattr(f, 'read'):
+            f = io.open(f, encoding='utf_8_sig')
+        with f:
+            for line in f:
+                yield line.rstrip('\r\n')
+
+
+def _tag_lines(client, lines, out, format, lower, chunk_size):
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            break
+        if format == 'wakati':
+            out.writelines([' '.join(words) + '\n'
+                            for words in client.wakati_batch(chunk, lower)])
+        else:
+            out.writelines([str(token) + '\n'
+                            for token in client.tagging_batch(chunk, lower)])
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m nagisa client',
+                                     description='Tag the lines with the nagisa server.')
+    parser.add_argument('files', nargs='*', help='Input files (the default is stdin)')
+    parser.add_argument('--socket', type=str, default=None, help='Path to the socket')
+    parser.add_argument('--model', type=str, default='default', help='The name of the model')
+    parser.add_argument('--format', type=str, default='tagging', choices=['wakati', 'tagging'])
+    parser.add_argument('--lower', action='store_true')
+    parser.add_argument('--chunk_size', type=int, default=256)
+    parser.add_argument('--info', action='store_true', help='Print the server information')
+    args = parser.parse_args(argv)
+
+    stdout = sys.stdout.buffer if hasattr(sys.stdout, 'buffer') else sys.stdout
+    out = io.TextIOWrapper(stdout, encoding='utf-8', newline='\n')
+    try:
+        with Client(args.socket, args.model, chunk_size=args.chunk_size) as client:
+            if args.info:
+                out.write(json.dumps(client.info(), indent=2, sort_keys=True) + '\n')
+            else:
+                _tag_lines(client, _read_lines(args.files), out, args.format, args.lower,
+                           args.chunk_size)
+    finally:
+        out.flush()
+        # sys.stdout is not closed with the wrapper.
+        out.detach()
+
+
+if __name__ == '__main__':
+    main()
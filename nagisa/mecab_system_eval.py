@@ -12,13 +12,17 @@ else:
 
 
 def readFile(filename):
+    return list(iterFile(filename))
+
+
+def iterFile(filename):
+    """Yield the sentences of the file one by one without loading the whole file."""
     sent = []
-    data = []
     with codecs.open(filename, 'r', encoding='utf_8_sig') as f:
         for line in f:
             line = line.rstrip()
             if line == "EOS":
-                data.append(sent)
+                yield sent
                 sent = []
             else:
                 surface, csv_form = line.split("\t")
@@ -27,7 +31,6 @@ def readFile(filename):
                     surface  = surface.encode("UTF-8")
                     csv_form = csv_form.encode("UTF-8")
                 sent.append([surface, csv_form])
-    return data
 
 
 def mecab_eval(sys_data, ans_data):
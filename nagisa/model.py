@@ -7,10 +7,15 @@ import dynet_config
 dynet_config.set(mem=32, random_seed=1234)
 import dynet as dy
 
+import nagisa.np_model as np_model
+
 
 class Model(object):
 
-    def __init__(self, hp, params=None, embs=None):
+    # The sentences in a minibatch must have the same length (see encode_ws_batch).
+    batch_by_exact_length = True
+
+    def __init__(self, hp, params=None, embs=None, arrays=None):
         # Set hyperparameters.
         dim_uni      = hp['DIM_UNI']
         dim_bi       = hp['DIM_BI']
@@ -69,10 +74,20 @@ class Model(object):
         self.b_pos = model.add_parameters(size_postags)
         self.dim_word    = dim_word
         self.dim_tag_emb = dim_tag_emb
+        self.dim_uni     = dim_uni
+        self.dim_bi      = dim_bi
+        self.dim_ctype   = dim_ctype
 
         # Load trained parameters.
         if params:
             model.populate(params)
+        elif arrays is not None:
+            # The arrays are named as np_model.export_arrays names them.
+            lookup_names, param_names = np_model.array_names(hp)
+            for name, p in zip(lookup_names, model.lookup_parameters_list()):
+                p.init_from_array(np.asarray(arrays[name], dtype=np.float32))
+            for name, p in zip(param_names, model.parameters_list()):
+                p.set_value(np.asarray(arrays[name], dtype=np.float32))
         self.model = model
 
         # As nparray
@@ -88,31 +103,73 @@ class Model(object):
         w_ws = self.w_ws
         b_ws = self.b_ws
 
-        ipts = []
-        length = len(X[0])
-        for i in range(length):
-            uni   = X[0][i]
-            bi    = X[1][i]
-            ctype = X[2][i]
-            start = X[3][i]
-            end   = X[4][i]
-
-            vec_uni   = dy.concatenate([self.UNI[uid] for uid in uni])
-            vec_bi    = dy.concatenate([self.BI[bid] for bid in bi])
-            vec_start = dy.esum([self.WORD[sid] for sid in start])
-            vec_end   = dy.esum([self.WORD[eid] for eid in end])
-            vec_ctype = dy.concatenate([self.CTYPE[cid] for cid in ctype])
-            vec_at_i  = dy.concatenate([vec_uni, vec_bi, vec_ctype, vec_start, vec_end])
-
-            if train is True:
-                vec_at_i = dy.dropout(vec_at_i, self.dropout_rate)
-            ipts.append(vec_at_i)
+        ipts = self._ws_inputs(X, train)
+        bilstm_outputs = self.ws_model.transduce(ipts)
+        observations   = [w_ws*h+b_ws for h in bilstm_outputs]
+        return observations
+
+
+    def encode_ws_batch(self, Xs):
+        """Encode the sentences of the same length as one minibatch.
+
+        Each element of the returned list is a batched expression
+        whose i-th batch element is the observation of Xs[i].
+        """
+        dy.renew_cg()
+
+        w_ws = self.w_ws
+        b_ws = self.b_ws
 
+        ipts = _columns(self._ws_input_matrix(Xs), len(Xs))
         bilstm_outputs = self.ws_model.transduce(ipts)
         observations   = [w_ws*h+b_ws for h in bilstm_outputs]
         return observations
 
 
+    def ws_observations(self, X):
+        """Return the observations of X as an array of the shape (length, 6)."""
+        return np.array([ob.npvalue() for ob in self.encode_ws(X)])
+
+
+    def ws_observations_batch(self, Xs):
+        """Return the observations of each sentence in Xs (of the same length)."""
+        obs = self.encode_ws_batch(Xs)
+        batch_size = len(Xs)
+        # The value of a batched expression has the shape (6, batch_size).
+        values = [np.reshape(ob.npvalue(), (-1, batch_size)) for ob in obs]
+        return [np.array([value[:, b] for value in values]) for b in range(batch_size)]
+
+
+    def _ws_inputs(self, X, train=False):
+        if len(X[0]) == 0:
+            return []
+        return _columns(self._ws_input_matrix([X], train), 1)
+
+
+    def _ws_input_matrix(self, Xs, train=False):
+        # The input vectors of all characters of Xs are the columns of a matrix,
+        # which is gathered with a few batched lookups instead of the lookups
+        # of each character.
+        positions = [position for X in Xs for position in zip(*X)]
+        length = len(positions)
+        ws = len(positions[0][0])
+
+        def window(table, k, dim):
+            ids = [i for position in positions for i in position[k]]
+            return dy.reshape(dy.lookup_batch(table, ids), (dim*ws, length), batch_size=1)
+
+        vec_uni   = window(self.UNI, 0, self.dim_uni)
+        vec_bi    = window(self.BI, 1, self.dim_bi)
+        vec_ctype = window(self.CTYPE, 2, self.dim_ctype)
+        vec_start = _bag(self.WORD, [position[3] for position in positions], self.dim_word)
+        vec_end   = _bag(self.WORD, [position[4] for position in positions], self.dim_word)
+        ipts = dy.concatenate([vec_uni, vec_bi, vec_ctype, vec_start, vec_end])
+
+        if train is True:
+            ipts = dy.dropout(ipts, self.dropout_rate)
+        return ipts
+
+
     def forward(self, observations):
 
         def log_sum_exp(scores):
@@ -192,37 +249,66 @@ class Model(object):
         w_pos = self.w_pos
         b_pos = self.b_pos
 
-        ipts  = []
-        length = len(X[0])
-        for i in range(length):
-            cids = X[0][i]
-            wid  = X[1][i]
-            tids = X[2][i]
-            vec_char = self.char_seq_model.transduce([self.UNI[cid] for cid in cids])[-1]
-
-            vec_tags = []
-            for tid in tids:
-                if tid == 0:
-                    zero = dy.inputVector(np.zeros(self.dim_tag_emb))
-                    vec_tags.append(zero)
-                else:
-                    vec_tags.append(self.POS[tid])
-            vec_tag = dy.esum(vec_tags)
-
-            if wid == 0:
-                vec_word = dy.inputVector(np.zeros(self.dim_word))
-            else:
-                vec_word = self.WORD[wid]
-
-            vec_at_i = dy.concatenate([vec_word, vec_char, vec_tag])
-            if train is True:
-                vec_at_i = dy.dropout(vec_at_i, self.dropout_rate)
-            ipts.append(vec_at_i)
+        ipts = self._pt_inputs(X, train)
         hiddens = self.pos_model.transduce(ipts)
         probs = [dy.softmax(w_pos*h+b_pos) for h in hiddens]
         return probs
 
 
+    def encode_pt_batch(self, Xs):
+        """Encode the sentences with the same number of words as one minibatch."""
+        dy.renew_cg()
+
+        w_pos = self.w_pos
+        b_pos = self.b_pos
+
+        ipts = _columns(self._pt_input_matrix(Xs), len(Xs))
+        hiddens = self.pos_model.transduce(ipts)
+        probs = [dy.softmax(w_pos*h+b_pos) for h in hiddens]
+        return probs
+
+
+    def _pt_inputs(self, X, train=False):
+        if len(X[0]) == 0:
+            return []
+        return _columns(self._pt_input_matrix([X], train), 1)
+
+
+    def _pt_input_matrix(self, Xs, train=False):
+        # The input vectors of all words of Xs are the columns of a matrix.
+        # The words of the same length are encoded by the char BiLSTM as a minibatch,
+        # and the ids of 0 (unknown words and tags) are zero vectors.
+        words = [word for X in Xs for word in zip(*X)]
+        vec_word = _bag(self.WORD, [[wid] for _, wid, _ in words], self.dim_word, zero_id=0)
+        vec_char = self._encode_chars([cids for cids, _, _ in words])
+        vec_tag  = _bag(self.POS, [tids for _, _, tids in words], self.dim_tag_emb, zero_id=0)
+        ipts = dy.concatenate([vec_word, vec_char, vec_tag])
+
+        if train is True:
+            ipts = dy.dropout(ipts, self.dropout_rate)
+        return ipts
+
+
+    def _encode_chars(self, cids_list):
+        indice_by_length = {}
+        for i, cids in enumerate(cids_list):
+            indice_by_length.setdefault(len(cids), []).append(i)
+
+        order = []
+        vecs  = []
+        for length, indice in sorted(indice_by_length.items()):
+            ipts = [dy.lookup_batch(self.UNI, [cids_list[i][t] for i in indice])
+                    for t in range(length)]
+            vec = self.char_seq_model.transduce(ipts)[-1]
+            vecs.append(dy.reshape(vec, (self.dim_uni, len(indice)), batch_size=1))
+            order.extend(indice)
+
+        # Put the columns back in the order of the words.
+        position = {i: k for k, i in enumerate(order)}
+        return dy.select_cols(dy.concatenate_cols(vecs),
+                              [position[i] for i in range(len(cids_list))])
+
+
     def get_POStagging_loss(self, X, Y):
         losses = []
         probs = self.encode_pt(X, train=True)
@@ -236,3 +322,42 @@ class Model(object):
         probs = self.encode_pt(X)
         pids = [np.argmax(prob.npvalue()) for prob in probs]
         return pids
+
+
+    def POStagging_batch(self, Xs):
+        probs = self.encode_pt_batch(Xs)
+        batch_size = len(Xs)
+        # The value of a batched expression has the shape (size_postags, batch_size).
+        values = [np.reshape(prob.npvalue(), (-1, batch_size)) for prob in probs]
+        pids = [[np.argmax(value[:, b]) for value in values] for b in range(batch_size)]
+        return pids
+
+
+def _bag(table, ids_list, dim, zero_id=None):
+    """Return the sums of the vectors of each list of ids as the columns of a matrix.
+
+    The k-th ids of all lists are looked up at once, and the missing ids
+    (and zero_id) are masked out, so the vectors are summed in the order of the lists.
+    """
+    length = len(ids_list)
+    width  = max(len(ids) for ids in ids_list)
+    terms  = []
+    for k in range(width):
+        ids  = [ids[k] if k < len(ids) else 0 for ids in ids_list]
+        mask = [k < len(ids) and ids[k] != zero_id for ids in ids_list]
+        vecs = dy.reshape(dy.lookup_batch(table, ids), (dim, length), batch_size=1)
+        if not all(mask):
+            mask = np.tile(np.array(mask, dtype=np.float32), (dim, 1))
+            vecs = dy.cmult(vecs, dy.inputTensor(mask))
+        terms.append(vecs)
+    return dy.esum(terms)
+
+
+def _columns(matrix, batch_size):
+    """Split a matrix of the inputs of batch_size sentences of the same length
+    into a list of the batched input vectors at each position."""
+    rows, columns = matrix.dim()[0]
+    length = columns // batch_size
+    if batch_size > 1:
+        matrix = dy.reshape(matrix, (rows, length), batch_size=batch_size)
+    return [dy.pick(matrix, i, dim=1) for i in range(length)]
@@ -2,6 +2,7 @@
 
 from __future__ import division, print_function, absolute_import
 
+import os
 import re
 import sys
 import gzip
@@ -10,6 +11,8 @@ import numpy as np
 import unicodedata
 
 from six.moves import cPickle
+cimport cython
+from libc.string cimport memcmp
 
 reload(sys)
 if sys.version_info.major == 2:
@@ -35,25 +38,37 @@ cpdef unicode utf8rstrip(text):
         return text.rstrip()
 
 
+# str.isascii() is available in Python 3.7 or later.
+cdef bint _has_isascii = hasattr(u'', 'isascii')
+
+
 cpdef unicode normalize(unicode text):
+    # An ASCII text is always normalized. (The normalization of CPython also
+    # returns a normalized text as it is after a quick check.)
+    if _has_isascii and text.isascii():
+        return text
     return unicodedata.normalize('NFKC', text)
 
 
-cpdef unicode preprocess(text):
-    text = utf8rstrip(text)
-    text = normalize(text)
-    text = text.replace('İ', 'I')
-    text = text.replace(' ', '　')
-    return text
+cdef unicode _preprocess(unicode text, bint prenormalized):
+    # An ASCII text needs neither the normalization nor the replacement of 'İ'.
+    if not (_has_isascii and text.isascii()):
+        if not prenormalized:
+            text = unicodedata.normalize('NFKC', text)
+        text = text.replace(u'İ', u'I')
+    return text.replace(u' ', u'　')
+
+
+cpdef unicode preprocess(text, bint prenormalized=False):
+    """Normalize a text for the model. If prenormalized is True, \
+    the text is assumed to be NFKC-normalized already."""
+    return _preprocess(utf8rstrip(text), prenormalized)
 
 
-cpdef unicode preprocess_without_rstrip(text):
+cpdef unicode preprocess_without_rstrip(text, bint prenormalized=False):
     if type(text) != unicode:
         text = unicode(text, 'utf-8')
-    text = normalize(text)
-    text = text.replace('İ', 'I')
-    text = text.replace(' ', '　')
-    return text
+    return _preprocess(text, prenormalized)
 
 
 cpdef list get_unigram(unicode text):
@@ -85,7 +100,7 @@ cpdef int get_chartype(unicode character):
         return 5
 
 
-cpdef list get_words_starting_at_i(unicode text, dict dictionary):
+cpdef list get_words_starting_at_i(unicode text, dict dictionary, int max_length=8):
     cdef:
         int i
         int j
@@ -96,7 +111,7 @@ cpdef list get_words_starting_at_i(unicode text, dict dictionary):
 
     for i in range(length_text):
         subwords = []
-        for j in range(i, min(i+8, length_text)):
+        for j in range(i, min(i+max_length, length_text)):
             sub = text[i:j+1]
             if sub in dictionary:
                 subwords.append(dictionary[sub])
@@ -106,7 +121,7 @@ cpdef list get_words_starting_at_i(unicode text, dict dictionary):
     return words_starting_at_i
 
 
-cpdef list get_words_ending_at_i(unicode text, dict dictionary):
+cpdef list get_words_ending_at_i(unicode text, dict dictionary, int max_length=8):
     cdef:
         int i
         int j
@@ -117,7 +132,7 @@ cpdef list get_words_ending_at_i(unicode text, dict dictionary):
     text = text[::-1]
     for i in range(length_text):
         subwords = []
-        for j in range(i, min(i+8, length_text)):
+        for j in range(i, min(i+max_length, length_text)):
             sub = text[i:j+1][::-1]
             if sub in dictionary:
                 subwords.append(dictionary[sub])
@@ -127,7 +142,7 @@ cpdef list get_words_ending_at_i(unicode text, dict dictionary):
     return words_ending_at_i[::-1]
 
 
-cpdef list conv_tokens_to_ids(list words, dict word2id):
+cpdef list conv_tokens_to_ids(list words, word2id):
     cdef unicode word
     return [word2id[word] if word in word2id else word2id[__OOV] for word in words]
 
@@ -144,18 +159,27 @@ cpdef list context_window(list l, int win, int pad_id=1):
     return out
 
 
-cpdef list feature_extraction(unicode text, dict uni2id, dict bi2id,
-                              dict dictionary, int window_size):
+cpdef list feature_extraction(unicode text, uni2id, bi2id,
+                              dictionary, int window_size, WordIndex word_index=None,
+                              CharTable char_table=None):
     # character-level features
-    unigrams = get_unigram(text)
-    bigrams = get_bigram(text)
-    uids = context_window(conv_tokens_to_ids(unigrams, uni2id), window_size)
-    bids = context_window(conv_tokens_to_ids(bigrams, bi2id), window_size)
-    cids = context_window([get_chartype(uni) for uni in unigrams], window_size, pad_id=6)
+    if char_table is None:
+        unigrams = get_unigram(text)
+        bigrams = get_bigram(text)
+        uids = context_window(conv_tokens_to_ids(unigrams, uni2id), window_size)
+        bids = context_window(conv_tokens_to_ids(bigrams, bi2id), window_size)
+        cids = context_window([get_chartype(uni) for uni in unigrams], window_size, pad_id=6)
+    else:
+        uids = context_window(char_table.unigram_ids(text), window_size)
+        bids = context_window(char_table.bigram_ids(text), window_size)
+        cids = context_window(char_table.chartypes(text), window_size, pad_id=6)
 
     # word-level features
-    wids_s = get_words_starting_at_i(text, dictionary)
-    wids_e = get_words_ending_at_i(text, dictionary)
+    if word_index is None:
+        wids_s = get_words_starting_at_i(text, dictionary)
+        wids_e = get_words_ending_at_i(text, dictionary)
+    else:
+        wids_s, wids_e = word_index.lookup(text)
 
     features = [uids, bids, cids, wids_s, wids_e]
     return features
@@ -226,47 +250,149 @@ cpdef load_data(fn):
         return cPickle.load(gf)
 
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _viterbi(const double[:, :] trans, const double[:, :] obs, Py_ssize_t length,
+                   double[:] scores, double[:] next_scores,
+                   Py_ssize_t[:, :] bptrs, Py_ssize_t[:] path) noexcept nogil:
+    # The last two tags are the start tag and the end tag.
+    cdef:
+        Py_ssize_t num_tags = trans.shape[0]
+        Py_ssize_t sp_s = num_tags-2
+        Py_ssize_t sp_e = num_tags-1
+        Py_ssize_t t, i, j, best_j
+        double score, best_score
+
+    for i in range(num_tags):
+        scores[i] = -1e10
+    scores[sp_s] = 0
+
+    for t in range(length):
+        for i in range(num_tags):
+            # The first maximum is taken as np.argmax does.
+            best_j = 0
+            best_score = scores[0]+trans[i, 0]
+            for j in range(1, num_tags):
+                score = scores[j]+trans[i, j]
+                if score > best_score:
+                    best_score = score
+                    best_j = j
+            bptrs[t, i] = best_j
+            next_scores[i] = best_score+obs[t, i]
+        for i in range(num_tags):
+            scores[i] = next_scores[i]
+
+    best_j = 0
+    best_score = scores[0]+trans[sp_e, 0]
+    for j in range(1, num_tags):
+        score = scores[j]+trans[sp_e, j]
+        if score > best_score:
+            best_score = score
+            best_j = j
+
+    for t in range(length-1, -1, -1):
+        path[t] = best_j
+        best_j = bptrs[t, best_j]
+
+
 cpdef list np_viterbi(trans, observations):
+    """Return the best tag sequence of the observations (length x tags)."""
+    cdef:
+        const double[:, :] trans_view = np.asarray(trans, dtype=np.float64)
+        const double[:, :] obs_view
+        Py_ssize_t num_tags = trans_view.shape[0]
+        Py_ssize_t length
+        double[:] scores, next_scores
+        Py_ssize_t[:, :] bptrs
+        Py_ssize_t[:] path
+
+    observations = np.asarray(observations, dtype=np.float64)
+    length = observations.shape[0]
+    if length == 0:
+        return []
+    obs_view = observations
+
+    scores = np.empty(num_tags, dtype=np.float64)
+    next_scores = np.empty(num_tags, dtype=np.float64)
+    bptrs = np.empty((length, num_tags), dtype=np.intp)
+    path = np.empty(length, dtype=np.intp)
+    with nogil:
+        _viterbi(trans_view, obs_view, length, scores, next_scores, bptrs, path)
+    return list(path)
+
+
+cpdef list viterbi_batch(trans, observations, lengths=None):
+    """Return the best tag sequences of the sentences in a minibatch.
+
+    args:
+        - trans (np.ndarray): The transition scores (tags x tags).
+        - observations (np.ndarray or list): A padded array (batch x length x tags) \
+                                             or a list of the arrays (length x tags).
+        - lengths (list, optional): The lengths of the sentences in the padded array.
+
+    return:
+        - list : A list of the tag sequences.
+    """
     cdef:
-        int idx, best_tag_id
-        list bptrs_t, vvars_t, backpointer, indice, best_path
-
-    for_expr = np.array([-1e10]*6)
-    for_expr[4] = 0 # sp_s = 4
-    indice = [0,1,2,3,4,5]
-    backpointer = []
-
-    for obs in observations:
-        bptrs_t = []
-        vvars_t = []
-        for idx in indice:
-            next_tag_expr = for_expr+trans[idx]
-            best_tag_id = np.argmax(next_tag_expr)
-            bptrs_t.append(best_tag_id)
-            vvars_t.append(next_tag_expr[best_tag_id])
-        for_expr = np.array(vvars_t) + obs
-        backpointer.append(bptrs_t)
-
-    terminal_expr = for_expr + trans[5] # sp_e = 5
-    best_tag_id = np.argmax(terminal_expr)
-    best_path = [best_tag_id]
-
-    for bptrs_t in reversed(backpointer):
-        best_tag_id = bptrs_t[best_tag_id]
-        best_path.append(best_tag_id)
-
-    best_path.pop()
-    best_path.reverse()
-    return best_path
+        const double[:, :] trans_view = np.asarray(trans, dtype=np.float64)
+        const double[:, :, :] obs_view
+        const Py_ssize_t[:] length_view
+        Py_ssize_t num_tags = trans_view.shape[0]
+        Py_ssize_t b, batch_size, max_length
+        Py_ssize_t[:, :] path_view
+        double[:] scores, next_scores
+        Py_ssize_t[:, :] bptrs
+
+    if lengths is None:
+        lengths = [len(obs) for obs in observations]
+    batch_size = len(lengths)
+    if batch_size == 0:
+        return []
+    max_length = max(lengths)
+
+    if isinstance(observations, np.ndarray):
+        padded = np.asarray(observations, dtype=np.float64)
+    else:
+        padded = np.zeros((batch_size, max_length, num_tags), dtype=np.float64)
+        for b in range(batch_size):
+            if lengths[b] > 0:
+                padded[b, :lengths[b]] = observations[b]
+    if padded.shape[1] == 0:
+        return [[] for b in range(batch_size)]
+    obs_view = padded
+    length_view = np.asarray(lengths, dtype=np.intp)
+
+    # The buffers are allocated once and reused for all sentences.
+    scores = np.empty(num_tags, dtype=np.float64)
+    next_scores = np.empty(num_tags, dtype=np.float64)
+    bptrs = np.empty((max_length, num_tags), dtype=np.intp)
+    paths = np.empty((batch_size, max_length), dtype=np.intp)
+    path_view = paths
+    with nogil:
+        for b in range(batch_size):
+            _viterbi(trans_view, obs_view[b], length_view[b],
+                     scores, next_scores, bptrs, path_view[b])
+    return [paths[b, :lengths[b]].tolist() for b in range(batch_size)]
 
 
 cpdef load_file(filename, delimiter='\t', newline='EOS'):
     cdef:
-        list X, Y, words, tags
-        unicode word, tag
+        list X, Y
 
     X = []
     Y = []
+    for words, tags in iter_file(filename, delimiter, newline):
+        X.append(words)
+        Y.append(tags)
+    return X, Y
+
+
+def iter_file(filename, delimiter='\t', newline='EOS'):
+    """Yield the pairs of the words and the tags of each sentence one by one."""
+    cdef:
+        list words, tags
+        unicode word, tag
+
     words = []
     tags = []
 
@@ -278,8 +404,7 @@ cpdef load_file(filename, delimiter='\t', newline='EOS'):
                 if not len(words) == len(tags):
                     raise AssertionError("len(words) != len(tags)")
 
-                X.append(words)
-                Y.append(tags)
+                yield words, tags
                 words = []
                 tags = []
             else:
@@ -289,4 +414,442 @@ cpdef load_file(filename, delimiter='\t', newline='EOS'):
                 words.append(word)
                 tags.append(tag)
 
-    return X, Y
+
+cdef class StringTable:
+    """A read-only mapping from strings to ints or lists of ints.
+
+    The keys are stored as sorted UTF-8 strings with an offset array,
+    and a key is found by binary search. The arrays can be loaded from
+    memory-mapped files, so that processes share one physical copy.
+    """
+    cdef readonly object keys_data, key_offsets, values, value_offsets
+    cdef const unsigned char[:] _keys
+    cdef const long long[:] _key_offsets
+    cdef const int[:] _values
+    cdef const long long[:] _value_offsets
+    cdef bint _has_lists
+
+    def __init__(self, keys_data, key_offsets, values, value_offsets=None):
+        self.keys_data = keys_data
+        self.key_offsets = key_offsets
+        self.values = values
+        self.value_offsets = value_offsets
+        self._keys = keys_data
+        self._key_offsets = key_offsets
+        self._values = values
+        self._has_lists = value_offsets is not None
+        if self._has_lists:
+            self._value_offsets = value_offsets
+
+    @classmethod
+    def from_dict(cls, dict dictionary):
+        """Build a table from a dict whose values are ints or lists of ints."""
+        cdef list keys = sorted(dictionary, key=_encode)
+        cdef list encoded = [_encode(key) for key in keys]
+        key_offsets = np.zeros(len(keys)+1, dtype=np.int64)
+        key_offsets[1:] = np.cumsum([len(key) for key in encoded])
+        keys_data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        has_lists = any(isinstance(v, (list, tuple)) for v in dictionary.values())
+        if has_lists:
+            value_lists = [list(dictionary[key]) for key in keys]
+            value_offsets = np.zeros(len(keys)+1, dtype=np.int64)
+            value_offsets[1:] = np.cumsum([len(v) for v in value_lists])
+            values = np.array([v for vs in value_lists for v in vs], dtype=np.int32)
+        else:
+            value_offsets = None
+            values = np.array([dictionary[key] for key in keys], dtype=np.int32)
+        return cls(keys_data, key_offsets, values, value_offsets)
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r'):
+        """Load a table saved by save(). The files are memory-mapped by default."""
+        arrays = [np.load(prefix+'.'+name+'.npy', mmap_mode=mmap_mode)
+                  for name in ['keys', 'key_offsets', 'values']]
+        value_offsets = None
+        if os.path.exists(prefix+'.value_offsets.npy'):
+            value_offsets = np.load(prefix+'.value_offsets.npy', mmap_mode=mmap_mode)
+        return cls(arrays[0], arrays[1], arrays[2], value_offsets)
+
+    def save(self, prefix):
+        """Save the arrays as prefix.{keys,key_offsets,values,value_offsets}.npy."""
+        np.save(prefix+'.keys.npy', np.asarray(self.keys_data))
+        np.save(prefix+'.key_offsets.npy', np.asarray(self.key_offsets))
+        np.save(prefix+'.values.npy', np.asarray(self.values))
+        if self._has_lists:
+            np.save(prefix+'.value_offsets.npy', np.asarray(self.value_offsets))
+
+    cdef Py_ssize_t _find(self, unicode key):
+        cdef:
+            bytes encoded = _encode(key)
+            const unsigned char* k = encoded
+            Py_ssize_t length = len(encoded)
+            Py_ssize_t lo = 0
+            Py_ssize_t hi = self._key_offsets.shape[0]-1
+            Py_ssize_t mid, start, size
+            int cmp
+
+        while lo < hi:
+            mid = (lo+hi) // 2
+            start = self._key_offsets[mid]
+            size = self._key_offsets[mid+1]-start
+            cmp = memcmp(&self._keys[start] if size > 0 else k, k, min(size, length))
+            if cmp == 0:
+                cmp = (size > length) - (size < length)
+            if cmp == 0:
+                return mid
+            elif cmp < 0:
+                lo = mid+1
+            else:
+                hi = mid
+        return -1
+
+    cdef object _value(self, Py_ssize_t i):
+        if self._has_lists:
+            return [self._values[j] for j in range(self._value_offsets[i],
+                                                   self._value_offsets[i+1])]
+        return self._values[i]
+
+    def get(self, key, default=None):
+        cdef Py_ssize_t i = self._find(key)
+        if i < 0:
+            return default
+        return self._value(i)
+
+    def __getitem__(self, key):
+        cdef Py_ssize_t i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._value(i)
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __len__(self):
+        return self._key_offsets.shape[0]-1
+
+    def __iter__(self):
+        cdef Py_ssize_t i
+        for i in range(len(self)):
+            yield bytes(self._keys[self._key_offsets[i]:self._key_offsets[i+1]]).decode(
+                'utf-8', 'surrogatepass')
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(key, self._value(i)) for i, key in enumerate(self)]
+
+    def __reduce__(self):
+        return (StringTable, (np.asarray(self.keys_data), np.asarray(self.key_offsets),
+                              np.asarray(self.values), None if not self._has_lists
+                              else np.asarray(self.value_offsets)))
+
+
+cdef bytes _encode(unicode text):
+    return text.encode('utf-8', 'surrogatepass')
+
+
+cdef class WordIndex:
+    """A trie of the words in a dictionary.
+
+    lookup() finds the words starting and ending at each position of a text
+    in one left-to-right pass, with the same results as get_words_starting_at_i()
+    and get_words_ending_at_i(). The children of a node are sorted by codepoint
+    and found by binary search, so a walk stops as soon as no word has the prefix.
+
+    args:
+        - dictionary (dict): A mapping from words to ids. The id of the OOV symbol \
+                             is used for the positions without words.
+        - max_length (int, optional): The maximum length of the words to find.
+    """
+    cdef readonly int max_length
+    cdef readonly int oov_id
+    cdef readonly object edge_start, edge_chars, edge_targets, word_ids
+    cdef const long long[:] _edge_start
+    cdef const int[:] _edge_chars
+    cdef const int[:] _edge_targets
+    cdef const int[:] _word_ids
+
+    def __init__(self, dictionary=None, int max_length=8, arrays=None):
+        if max_length < 1:
+            raise ValueError("max_length must be a positive integer.")
+        self.max_length = max_length
+        if arrays is None:
+            arrays = _build_trie(dictionary)
+        self.oov_id, self.edge_start, self.edge_chars, self.edge_targets, self.word_ids = arrays
+        self._edge_start = self.edge_start
+        self._edge_chars = self.edge_chars
+        self._edge_targets = self.edge_targets
+        self._word_ids = self.word_ids
+
+    def __reduce__(self):
+        return (WordIndex, (None, self.max_length,
+                            (self.oov_id, np.asarray(self.edge_start),
+                             np.asarray(self.edge_chars), np.asarray(self.edge_targets),
+                             np.asarray(self.word_ids))))
+
+    def save(self, filename):
+        """Save the trie as a .npz file."""
+        np.savez(filename, max_length=self.max_length, oov_id=self.oov_id,
+                 edge_start=np.asarray(self.edge_start), edge_chars=np.asarray(self.edge_chars),
+                 edge_targets=np.asarray(self.edge_targets), word_ids=np.asarray(self.word_ids))
+
+    @classmethod
+    def load(cls, filename):
+        """Load a trie saved by save()."""
+        with np.load(filename) as f:
+            return cls(None, int(f['max_length']),
+                       (int(f['oov_id']), f['edge_start'], f['edge_chars'],
+                        f['edge_targets'], f['word_ids']))
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int _child(self, int node, int char) noexcept nogil:
+        cdef:
+            long long lo = self._edge_start[node]
+            long long hi = self._edge_start[node+1]
+            long long mid
+        while lo < hi:
+            mid = (lo+hi) // 2
+            if self._edge_chars[mid] < char:
+                lo = mid+1
+            else:
+                hi = mid
+        if lo < self._edge_start[node+1] and self._edge_chars[lo] == char:
+            return self._edge_targets[lo]
+        return -1
+
+    cdef Py_ssize_t _longest_at(self, unicode text, Py_ssize_t i):
+        # Return the end of the longest word starting at i, or -1.
+        cdef:
+            Py_ssize_t j, best = -1
+            int node = 0
+        for j in range(i, min(i+self.max_length, len(text))):
+            node = self._child(node, text[j])
+            if node < 0:
+                break
+            if self._word_ids[node] >= 0:
+                best = j+1
+        return best
+
+    cpdef tuple next_match(self, unicode text, Py_ssize_t start=0):
+        """Return the (start, end) span of the leftmost longest word \
+        at or after start, or None if there is no word."""
+        cdef Py_ssize_t i, end
+        for i in range(start, len(text)):
+            end = self._longest_at(text, i)
+            if end > 0:
+                return (i, end)
+        return None
+
+    cpdef list longest_matches(self, unicode text):
+        """Return the (start, end) spans of the words in the text, \
+        scanning from left to right and taking the longest word at each start."""
+        cdef:
+            Py_ssize_t i = 0, end
+            Py_ssize_t length_text = len(text)
+            list spans = []
+
+        while i < length_text:
+            end = self._longest_at(text, i)
+            if end > 0:
+                spans.append((i, end))
+                i = end
+            else:
+                i += 1
+        return spans
+
+    cpdef tuple lookup(self, unicode text):
+        """Return the ids of the words starting at each position and \
+        the ids of the words ending at each position of the text."""
+        cdef:
+            Py_ssize_t i, j
+            Py_ssize_t length_text = len(text)
+            int node, word_id
+            list starts = [[] for i in range(length_text)]
+            list ends = [[] for i in range(length_text)]
+            list subwords
+
+        for i in range(length_text):
+            subwords = starts[i]
+            node = 0
+            for j in range(i, min(i+self.max_length, length_text)):
+                node = self._child(node, text[j])
+                if node < 0:
+                    break
+                word_id = self._word_ids[node]
+                if word_id >= 0:
+                    subwords.append(word_id)
+                    ends[j].append(word_id)
+
+        for i in range(length_text):
+            if len(starts[i]) == 0:
+                starts[i].append(self.oov_id)
+            if len(ends[i]) == 0:
+                ends[i].append(self.oov_id)
+            else:
+                # The shorter words come first as in get_words_ending_at_i().
+                ends[i].reverse()
+        return starts, ends
+
+
+def _build_trie(dict dictionary):
+    # The nodes are numbered in depth-first order from the root (0),
+    # and the edges are grouped by the parent node and sorted by codepoint.
+    cdef:
+        list words = sorted(dictionary)
+        list stack = [0]
+        list parents = []
+        list chars = []
+        list word_ids = [-1]
+        unicode word, prev = u''
+        Py_ssize_t k, lcp
+
+    for word in words:
+        lcp = 0
+        while lcp < len(word) and lcp < len(prev) and word[lcp] == prev[lcp]:
+            lcp += 1
+        del stack[lcp+1:]
+        for k in range(lcp, len(word)):
+            parents.append(stack[-1])
+            chars.append(ord(word[k]))
+            stack.append(len(word_ids))
+            word_ids.append(-1)
+        word_ids[stack[-1]] = dictionary[word]
+        prev = word
+
+    parents_array = np.array(parents, dtype=np.int64)
+    order = np.argsort(parents_array, kind='stable')
+    edge_start = np.searchsorted(parents_array[order], np.arange(len(word_ids)+1)).astype(np.int64)
+    edge_chars = np.array(chars, dtype=np.int32)[order]
+    # The node of the k-th edge is k+1 in depth-first order.
+    edge_targets = (order+1).astype(np.int32)
+    return (dictionary.get(__OOV, -1), edge_start, edge_chars, edge_targets,
+            np.array(word_ids, dtype=np.int32))
+
+
+# The character types of all codepoints (see get_chartype).
+# -1 means that the type has not been computed yet.
+cdef signed char[:] _chartypes = np.full(0x110000, -1, dtype=np.int8)
+
+# The codepoint of the end symbol of the last bigram.
+cdef long long _END_OF_TEXT = 0x110000
+
+
+cdef inline unsigned long long _hash_bigram(long long key) noexcept nogil:
+    return (<unsigned long long>key * 0x9E3779B97F4A7C15ULL) >> 20
+
+
+cdef class CharTable:
+    """Lookup tables of the character-level features of a model.
+
+    The unigram ids and the character types are indexed by codepoint,
+    and the bigram ids are stored in an open-addressing hash table keyed
+    by a pair of codepoints, so no string is created for each character.
+    The results are the same as those of conv_tokens_to_ids() with
+    get_unigram() and get_bigram(), and of get_chartype().
+
+    args:
+        - uni2id (dict): A mapping from characters to unigram ids.
+        - bi2id (dict): A mapping from character bigrams to bigram ids.
+        - arrays (tuple, optional): (uni_oov, bi_oov, uni_ids, bi_keys, bi_values) \
+                                    of a table built before, used instead of the dicts.
+    """
+    cdef readonly object uni_ids, bi_keys, bi_values
+    cdef readonly int uni_oov, bi_oov
+    cdef const int[:] _uni_ids
+    cdef const long long[:] _bi_keys
+    cdef const int[:] _bi_values
+    cdef unsigned long long _mask
+
+    def __init__(self, dict uni2id=None, dict bi2id=None, arrays=None):
+        if arrays is None:
+            arrays = _build_char_table(uni2id, bi2id)
+        self.uni_oov, self.bi_oov, self.uni_ids, self.bi_keys, self.bi_values = arrays
+        self._uni_ids, self._bi_keys, self._bi_values = self.uni_ids, self.bi_keys, self.bi_values
+        self._mask = len(self.bi_keys)-1
+
+    def __reduce__(self):
+        return (CharTable, (None, None,
+                            (self.uni_oov, self.bi_oov, np.asarray(self.uni_ids),
+                             np.asarray(self.bi_keys), np.asarray(self.bi_values))))
+
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef inline int _bigram_id(self, long long bigram) noexcept nogil:
+        cdef unsigned long long slot = _hash_bigram(bigram) & self._mask
+        while self._bi_keys[slot] >= 0:
+            if self._bi_keys[slot] == bigram:
+                return self._bi_values[slot]
+            slot = (slot+1) & self._mask
+        return self.bi_oov
+
+    cpdef list unigram_ids(self, unicode text):
+        """Return the unigram ids of the characters of the text."""
+        cdef:
+            Py_UCS4 c
+            list ids = []
+        for c in text:
+            if c < self._uni_ids.shape[0]:
+                ids.append(self._uni_ids[c])
+            else:
+                ids.append(self.uni_oov)
+        return ids
+
+    cpdef list bigram_ids(self, unicode text):
+        """Return the bigram ids at the positions of the text."""
+        cdef:
+            Py_ssize_t i
+            Py_ssize_t length_text = len(text)
+            long long second
+            list ids = []
+        for i in range(length_text):
+            second = text[i+1] if i+1 < length_text else _END_OF_TEXT
+            ids.append(self._bigram_id((<long long>text[i] << 21) | second))
+        return ids
+
+    cpdef list chartypes(self, unicode text):
+        """Return the character types of the characters of the text."""
+        cdef:
+            Py_UCS4 c
+            int t
+            list types = []
+        for c in text:
+            t = _chartypes[c]
+            if t < 0:
+                t = get_chartype(c)
+                _chartypes[c] = t
+            types.append(t)
+        return types
+
+
+def _build_char_table(dict uni2id, dict bi2id):
+    cdef:
+        unsigned long long size = 1, slot
+        long long bigram
+        int uni_oov = uni2id[__OOV]
+
+    chars = {ord(key): value for key, value in uni2id.items() if len(key) == 1}
+    uni_ids = np.full(max(chars)+1 if chars else 1, uni_oov, dtype=np.int32)
+    for c, value in chars.items():
+        uni_ids[c] = value
+
+    bigrams = {}
+    for key, value in bi2id.items():
+        if len(key) == 2:
+            bigrams[(ord(key[0]) << 21) | ord(key[1])] = value
+        elif len(key) == 4 and key[1:] == u'<E>':
+            bigrams[(ord(key[0]) << 21) | _END_OF_TEXT] = value
+    while size < 2 * len(bigrams):
+        size *= 2
+    bi_keys = np.full(size, -1, dtype=np.int64)
+    bi_values = np.zeros(size, dtype=np.int32)
+    for bigram, value in bigrams.items():
+        slot = _hash_bigram(bigram) & (size-1)
+        while bi_keys[slot] >= 0:
+            slot = (slot+1) & (size-1)
+        bi_keys[slot] = bigram
+        bi_values[slot] = value
+    return uni_oov, bi2id[__OOV], uni_ids, bi_keys, bi_values
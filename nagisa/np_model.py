@@ -0,0 +1,439 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+
+
+# The names of the arrays of a model in the order of the parameter file.
+# The parameters are followed by the lookup parameters (see Model.__init__).
+_LOOKUP_NAMES = ['UNI', 'BI', 'WORD', 'CTYPE', 'POS', 'trans']
+_PARAM_NAMES  = ['w_ws', 'b_ws', 'w_pos', 'b_pos']
+_BIRNN_NAMES  = ['ws_model', 'pos_model', 'char_seq_model']
+
+
+def load_dynet_params(fn):
+    """Read a parameter file saved by DyNet in the text format without DyNet.
+
+    args:
+        - fn (str): Path to a parameter file (*.params).
+
+    return:
+        - list : A list of (kind, name, array). A lookup parameter is \
+                 an array of the shape (vocabulary size, dimension).
+    """
+    params = []
+    with open(fn, 'r') as f:
+        for header in f:
+            values = f.readline()
+            kind, name, dim = header.split()[:3]
+            shape = tuple(int(d) for d in dim.strip('{}').split(','))
+            # DyNet stores a tensor in column-major order.
+            array = np.fromstring(values, dtype=np.float32, sep=' ')
+            array = array.reshape(shape, order='F')
+            if kind == '#LookupParameter#':
+                array = np.ascontiguousarray(array.T)
+            params.append((kind, name, array))
+    return params
+
+
+def export_arrays(hp, params):
+    """Convert a DyNet parameter file into a dict of named arrays.
+
+    The LSTM weights of a BiRNN are named '<birnn>/<layer>/<direction>/<Wx|Wh|b>',
+    where direction is 'f' (forward) or 'b' (backward).
+
+    args:
+        - hp (dict): The hyper-parameters of the model.
+        - params (str): Path to a parameter file (*.params).
+
+    return:
+        - dict : The arrays of the model.
+    """
+    params = load_dynet_params(params)
+    lookups = [array for kind, _, array in params if kind == '#LookupParameter#']
+    weights = [array for kind, _, array in params if kind == '#Parameter#']
+
+    num_lstm_params = 3 * 2 * hp['LAYERS'] * len(_BIRNN_NAMES)
+    if not len(lookups) == len(_LOOKUP_NAMES):
+        raise AssertionError("Unexpected number of lookup parameters in the model file.")
+    if not len(weights) == num_lstm_params + len(_PARAM_NAMES):
+        raise AssertionError("Unexpected number of parameters in the model file.")
+
+    lookup_names, param_names = array_names(hp)
+    arrays = dict(zip(lookup_names, lookups))
+    arrays.update(zip(param_names, weights))
+    return arrays
+
+
+def array_names(hp):
+    """Return the names of the arrays of a model in the order of the parameter file.
+
+    args:
+        - hp (dict): The hyper-parameters of the model.
+
+    return:
+        - list : The names of the lookup parameters.
+        - list : The names of the parameters.
+    """
+    param_names = []
+    for birnn in _BIRNN_NAMES:
+        for layer in range(hp['LAYERS']):
+            for direction in ['f', 'b']:
+                for name in ['Wx', 'Wh', 'b']:
+                    param_names.append('{}/{}/{}/{}'.format(birnn, layer, direction, name))
+    return list(_LOOKUP_NAMES), param_names + _PARAM_NAMES
+
+
+def load_arrays(hp, params):
+    """Load the arrays of a model from a DyNet parameter file or a quantized file.
+
+    args:
+        - hp (dict): The hyper-parameters of the model.
+        - params (str): Path to a parameter file (*.params) or a file \
+                        written by save_quantized().
+
+    return:
+        - dict : The arrays of the model.
+    """
+    if is_quantized(params):
+        return load_quantized(params)
+    return export_arrays(hp, params)
+
+
+class QuantizedTable(object):
+    """An embedding matrix stored as int8 values with a float32 scale per row.
+
+    Indexing the table returns the float32 rows, so it is used in place of
+    the lookup arrays of NumpyModel.
+    """
+
+    def __init__(self, q, scale):
+        self.q     = q
+        self.scale = scale
+        self.shape = q.shape
+        self.dtype = np.dtype(np.float32)
+
+    @property
+    def nbytes(self):
+        return self.q.nbytes + self.scale.nbytes
+
+    def __len__(self):
+        return len(self.q)
+
+    def __getitem__(self, ids):
+        ids = np.asarray(ids)
+        return self.q[ids] * self.scale[ids][..., None]
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.q * self.scale[:, None]
+        return array if dtype is None else array.astype(dtype)
+
+
+# The version of the format written by save_quantized().
+_QUANTIZED_FORMAT = 'nagisa-int8-1'
+
+
+def quantize_array(array):
+    """Quantize a matrix to int8 with a symmetric scale per row.
+
+    args:
+        - array (numpy.ndarray): A 2-D float matrix.
+
+    return:
+        - numpy.ndarray : The int8 values.
+        - numpy.ndarray : The float32 scales. A row is approximated by q * scale.
+    """
+    amax = np.abs(array).max(axis=1)
+    scale = np.where(amax > 0, amax / 127., 1.).astype(np.float32)
+    q = np.clip(np.rint(array / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale
+
+
+def save_quantized(fn, arrays):
+    """Write the arrays of a model with their matrices quantized to int8.
+
+    args:
+        - fn (str): Path to an output file (a .npz archive).
+        - arrays (dict): The arrays of the model (see export_arrays).
+    """
+    data = {'format': np.array(_QUANTIZED_FORMAT)}
+    for name, array in arrays.items():
+        array = np.asarray(array, dtype=np.float32)
+        # The transition matrix of the CRF is small, so it is kept as float32.
+        if array.ndim == 2 and name != 'trans':
+            data[name+'.q'], data[name+'.scale'] = quantize_array(array)
+        else:
+            data[name] = array
+    with open(fn, 'wb') as f:
+        np.savez(f, **data)
+
+
+def is_quantized(fn):
+    """Return True if fn is a file written by save_quantized()."""
+    with open(fn, 'rb') as f:
+        return f.read(4) == b'PK\x03\x04'
+
+
+def load_quantized(fn):
+    """Load the arrays written by save_quantized().
+
+    The lookup parameters are kept as QuantizedTable, and the other
+    matrices, which are multiplied in every step, are restored to float32.
+
+    args:
+        - fn (str): Path to a quantized file.
+
+    return:
+        - dict : The arrays of the model.
+    """
+    arrays = {}
+    with np.load(fn) as data:
+        if 'format' not in data.files or str(data['format']) != _QUANTIZED_FORMAT:
+            raise ValueError('{} is not a quantized nagisa model.'.format(fn))
+        for key in data.files:
+            if key.endswith('.q'):
+                name = key[:-len('.q')]
+                table = QuantizedTable(data[key], data[name+'.scale'])
+                arrays[name] = table if name in _LOOKUP_NAMES else np.asarray(table)
+            elif key != 'format' and not key.endswith('.scale'):
+                arrays[key] = data[key]
+    return arrays
+
+
+def _dot(X, W):
+    # np.dot of a 3-D array does not use BLAS, so multiply as a 2-D array.
+    return np.dot(X.reshape(-1, X.shape[-1]), W).reshape(X.shape[:-1]+(W.shape[-1],))
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+class _LSTM(object):
+    """A LSTM layer which computes the same function as dy.VanillaLSTMBuilder."""
+
+    # dy.VanillaLSTMBuilder adds 1 to the forget gate.
+    forget_bias = 1.0
+
+    def __init__(self, Wx, Wh, b):
+        self.Wx_T = np.ascontiguousarray(Wx.T)
+        self.Wh_T = np.ascontiguousarray(Wh.T)
+        self.b    = b
+        self.dim_hidden = Wh.shape[1]
+
+    def transduce(self, X, mask, reverse=False):
+        # X: (batch, time, dim_input), mask: (batch, time)
+        # The states of the padded steps are not updated,
+        # so the padding does not change the outputs of the real steps.
+        batch_size, length = mask.shape
+        hid = self.dim_hidden
+        XW = _dot(X, self.Wx_T) + self.b
+        h = np.zeros((batch_size, hid), dtype=np.float32)
+        c = np.zeros((batch_size, hid), dtype=np.float32)
+        H = np.zeros((batch_size, length, hid), dtype=np.float32)
+
+        steps = range(length-1, -1, -1) if reverse else range(length)
+        for t in steps:
+            gates = XW[:, t] + np.dot(h, self.Wh_T)
+            i = _sigmoid(gates[:, :hid])
+            f = _sigmoid(gates[:, hid:hid*2] + self.forget_bias)
+            o = _sigmoid(gates[:, hid*2:hid*3])
+            g = np.tanh(gates[:, hid*3:])
+            c_t = f * c + i * g
+            h_t = o * np.tanh(c_t)
+            m = mask[:, t:t+1]
+            c = np.where(m, c_t, c)
+            h = np.where(m, h_t, h)
+            H[:, t] = h_t
+        return H
+
+
+class _BiLSTM(object):
+    """A bi-directional LSTM which computes the same function as dy.BiRNNBuilder."""
+
+    def __init__(self, arrays, name, layers):
+        self.layers = []
+        for layer in range(layers):
+            prefix = '{}/{}/'.format(name, layer)
+            fwd = _LSTM(*[arrays[prefix+'f/'+n] for n in ['Wx', 'Wh', 'b']])
+            bwd = _LSTM(*[arrays[prefix+'b/'+n] for n in ['Wx', 'Wh', 'b']])
+            self.layers.append((fwd, bwd))
+
+    def transduce(self, X, mask):
+        """Return the outputs of the shape (batch, time, dim_hidden)."""
+        for fwd, bwd in self.layers:
+            H_f = fwd.transduce(X, mask)
+            H_b = bwd.transduce(X, mask, reverse=True)
+            X = np.concatenate([H_f, H_b], axis=2)
+        return X
+
+
+class NumpyModel(object):
+    """
+    This class runs a trained model only with NumPy.
+    The predictions are the same as those of nagisa.model.Model (up to float rounding),
+    and the sentences of different lengths are encoded together with padding.
+
+    args:
+        - hp (dict): The hyper-parameters of the model.
+        - params (str, optional): Path to a parameter file saved by DyNet (*.params), \
+                                  or a quantized file (see save_quantized).
+        - arrays (dict, optional): The arrays of the model (see export_arrays), \
+                                   which are used instead of params.
+    """
+
+    # The sentences in a minibatch do not need to have the same length.
+    batch_by_exact_length = False
+
+    def __init__(self, hp, params=None, arrays=None):
+        self.hp = hp
+        self.window_size = hp['WINDOW_SIZE']
+        self.dim_word    = hp['DIM_WORD']
+        self.dim_tag_emb = hp['DIM_TAGEMB']
+        self.dim_uni     = hp['DIM_UNI']
+
+        if arrays is None:
+            arrays = load_arrays(hp, params)
+        self.arrays = arrays
+        self.UNI   = arrays['UNI']
+        self.BI    = arrays['BI']
+        self.WORD  = arrays['WORD']
+        self.CTYPE = arrays['CTYPE']
+        self.POS   = arrays['POS']
+        self.w_ws  = arrays['w_ws']
+        self.b_ws  = arrays['b_ws']
+        self.w_pos = arrays['w_pos']
+        self.b_pos = arrays['b_pos']
+
+        layers = hp['LAYERS']
+        self.ws_model       = _BiLSTM(arrays, 'ws_model', layers)
+        self.pos_model      = _BiLSTM(arrays, 'pos_model', layers)
+        self.char_seq_model = _BiLSTM(arrays, 'char_seq_model', layers)
+
+        # As nparray
+        self.trans_array = arrays['trans']
+
+
+    def ws_observations(self, X):
+        return self.ws_observations_batch([X])[0]
+
+
+    def ws_observations_batch(self, Xs):
+        """Return the observations of the word segmentation model.
+
+        args:
+            - Xs (list): The features of the sentences (see feature_extraction).
+
+        return:
+            - list : The arrays of the shape (length, 6) for each sentence.
+        """
+        lengths = [len(X[0]) for X in Xs]
+        if max(lengths) == 0:
+            return [np.zeros((0, len(self.b_ws)), dtype=np.float32) for X in Xs]
+        ipts, mask = self._ws_inputs(Xs, lengths)
+        hiddens = self.ws_model.transduce(ipts, mask)
+        obs = _dot(hiddens, self.w_ws.T) + self.b_ws
+        return [obs[b, :length] for b, length in enumerate(lengths)]
+
+
+    def _ws_inputs(self, Xs, lengths):
+        batch_size = len(Xs)
+        max_length = max(lengths)
+        mask = np.zeros((batch_size, max_length), dtype=bool)
+        ws = self.window_size
+        # Padded positions use the id 1 (pad) and the character type 6.
+        uids = np.ones((batch_size, max_length, ws), dtype=np.int64)
+        bids = np.ones((batch_size, max_length, ws), dtype=np.int64)
+        cids = np.full((batch_size, max_length, ws), 6, dtype=np.int64)
+        vec_start = np.zeros((batch_size, max_length, self.dim_word), dtype=np.float32)
+        vec_end   = np.zeros((batch_size, max_length, self.dim_word), dtype=np.float32)
+        for b, (X, length) in enumerate(zip(Xs, lengths)):
+            if length == 0:
+                continue
+            mask[b, :length] = True
+            uids[b, :length] = X[0]
+            bids[b, :length] = X[1]
+            cids[b, :length] = X[2]
+            vec_start[b, :length] = self._sum_words(X[3])
+            vec_end[b, :length]   = self._sum_words(X[4])
+
+        vec_uni   = self.UNI[uids].reshape(batch_size, max_length, -1)
+        vec_bi    = self.BI[bids].reshape(batch_size, max_length, -1)
+        vec_ctype = self.CTYPE[cids].reshape(batch_size, max_length, -1)
+        ipts = np.concatenate([vec_uni, vec_bi, vec_ctype, vec_start, vec_end], axis=2)
+        return ipts, mask
+
+
+    def _sum_words(self, wids_at_i):
+        # Sum the word vectors of each position with one gather.
+        wids = [wid for wids in wids_at_i for wid in wids]
+        offsets = np.cumsum([0] + [len(wids) for wids in wids_at_i[:-1]])
+        return np.add.reduceat(self.WORD[wids], offsets, axis=0)
+
+
+    def POStagging(self, X):
+        return self.POStagging_batch([X])[0]
+
+
+    def POStagging_batch(self, Xs):
+        """Return the POS-tag ids of the words of each sentence.
+
+        args:
+            - Xs (list): A list of [cids, wids, tids] of each sentence.
+
+        return:
+            - list : The lists of the POS-tag ids.
+        """
+        lengths = [len(X[0]) for X in Xs]
+        batch_size = len(Xs)
+        max_length = max(lengths)
+        if max_length == 0:
+            return [[] for X in Xs]
+        mask = np.zeros((batch_size, max_length), dtype=bool)
+        for b, length in enumerate(lengths):
+            mask[b, :length] = True
+
+        # Encode the character sequences of all words in one minibatch.
+        cids = [cid for X in Xs for cid in X[0]]
+        vec_char = self._encode_chars(cids)
+
+        ipts = np.zeros((batch_size, max_length,
+                         self.dim_word+self.dim_uni+self.dim_tag_emb), dtype=np.float32)
+        n = 0
+        for b, (X, length) in enumerate(zip(Xs, lengths)):
+            if length == 0:
+                continue
+            wids = np.asarray(X[1])
+            # The vector of an unknown word (id 0) or an unknown tag (id 0) is zero.
+            vec_word = self.WORD[wids] * (wids != 0)[:, None]
+            tids = [tid for tids in X[2] for tid in tids]
+            offsets = np.cumsum([0] + [len(tids) for tids in X[2][:-1]])
+            tids = np.asarray(tids)
+            vec_tag = np.add.reduceat(self.POS[tids] * (tids != 0)[:, None], offsets, axis=0)
+            ipts[b, :length] = np.concatenate([vec_word, vec_char[n:n+length], vec_tag], axis=1)
+            n += length
+
+        hiddens = self.pos_model.transduce(ipts, mask)
+        scores = _dot(hiddens, self.w_pos.T) + self.b_pos
+        # The softmax does not change the argmax.
+        pids = np.argmax(scores, axis=2)
+        return [pids[b, :length].tolist() for b, length in enumerate(lengths)]
+
+
+    def _encode_chars(self, cids):
+        # The words of the same length are encoded together without padding.
+        vec_char = np.zeros((len(cids), self.dim_uni), dtype=np.float32)
+        indice_by_length = {}
+        for i, c in enumerate(cids):
+            indice_by_length.setdefault(len(c), []).append(i)
+
+        for length, indice in indice_by_length.items():
+            if length == 0:
+                continue
+            ids = np.array([cids[i] for i in indice], dtype=np.int64)
+            mask = np.ones(ids.shape, dtype=bool)
+            hiddens = self.char_seq_model.transduce(self.UNI[ids], mask)
+            # The output at the last character of each word.
+            vec_char[indice] = hiddens[:, -1]
+        return vec_char
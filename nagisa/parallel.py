@@ -0,0 +1,153 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import division, print_function, absolute_import
+
+import itertools
+import multiprocessing
+from collections import deque
+
+from nagisa.stats import TaggerStats
+
+
+# The tagger of a worker process.
+_worker_tagger = None
+
+
+def _init_worker(tagger):
+    # If the worker was not forked from the parent process, the tagger
+    # has been unpickled, that is, the model is loaded once in this process.
+    global _worker_tagger
+    _worker_tagger = tagger
+
+
+def _run_chunk(func, texts, args, buckets=None):
+    # If buckets is given, the stats of the chunk are recorded
+    # and sent back with the result.
+    if buckets is None:
+        return func(_worker_tagger, texts, *args), None
+    stats = _worker_tagger.enable_stats(TaggerStats(buckets))
+    try:
+        return func(_worker_tagger, texts, *args), stats
+    finally:
+        _worker_tagger.disable_stats()
+
+
+def _tag_chunk(tagger, texts, lower, batch_size):
+    tokens = tagger.tagging_batch(texts, lower, batch_size)
+    # A _Token object refers to the tagger, so only the words and
+    # the POS-tags are sent back to the parent process.
+    return [(token.words, token.postags) for token in tokens]
+
+
+def _chunks(texts, chunk_size):
+    texts = iter(texts)
+    while True:
+        chunk = list(itertools.islice(texts, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def _get_context():
+    # Forked workers inherit the loaded model copy-on-write.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def map_chunks(tagger, texts, func, args=(), n_jobs=None, chunk_size=256,
+               max_pending=None):
+    """Apply func(tagger, chunk, *args) to the chunks of the sentences with worker
+    processes and yield the chunks and the results in the input order.
+
+    args:
+        - tagger (Tagger): The tagger used in the parent process.
+        - texts (iterable): Input sentences. They are read lazily.
+        - func (function): A module-level function, which is sent to the workers.
+        - args (tuple): The other arguments of func.
+        - n_jobs (int): The number of worker processes. The default is the number of CPUs. \
+                        If n_jobs is 1, func is called in this process.
+        - chunk_size (int): The number of sentences sent to a worker at a time.
+        - max_pending (int): The maximum number of chunks in flight. \
+                             The default is 2*n_jobs.
+
+    yield:
+        - tuple : A chunk (list) and the result of func.
+
+    If the stats of the tagger are enabled, the stats recorded by the workers
+    are merged into them (see TaggerStats.merge).
+    """
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+    if n_jobs < 1:
+        raise ValueError("n_jobs must be a positive integer.")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer.")
+    if max_pending is None:
+        max_pending = 2 * n_jobs
+
+    if n_jobs == 1:
+        for chunk in _chunks(texts, chunk_size):
+            yield chunk, func(tagger, chunk, *args)
+        return
+
+    stats = tagger.stats
+    buckets = stats.buckets if stats is not None else None
+
+    def get(result):
+        result, worker_stats = result.get()
+        if worker_stats is not None:
+            stats.merge(worker_stats)
+        return result
+
+    ctx = _get_context()
+    pool = ctx.Pool(n_jobs, initializer=_init_worker, initargs=(tagger,))
+    try:
+        pending = deque()
+        for chunk in _chunks(texts, chunk_size):
+            result = pool.apply_async(_run_chunk, (func, chunk, args, buckets))
+            pending.append((chunk, result))
+            # Stop reading the input until the oldest chunk is finished.
+            while len(pending) >= max_pending:
+                chunk, result = pending.popleft()
+                yield chunk, get(result)
+
+        while pending:
+            chunk, result = pending.popleft()
+            yield chunk, get(result)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def tagging_many(tagger, texts, lower=False, n_jobs=None, chunk_size=256,
+                 max_pending=None, batch_size=32):
+    """Tag the sentences with worker processes and yield the results in the input order.
+
+    args:
+        - tagger (Tagger): The tagger used in the parent process.
+        - texts (iterable): Input sentences. They are read lazily.
+        - lower (bool): If lower is True, all uppercase characters in a list \
+                        of the words are converted into lowercase characters.
+        - n_jobs (int): The number of worker processes. The default is the number of CPUs.
+        - chunk_size (int): The number of sentences sent to a worker at a time.
+        - max_pending (int): The maximum number of chunks in flight. \
+                             The default is 2*n_jobs.
+        - batch_size (int): The maximum number of sentences in a minibatch.
+
+    yield:
+        - object : The object of the words with POS-tags.
+    """
+    if n_jobs == 1:
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer.")
+        for chunk in _chunks(texts, chunk_size):
+            for token in tagger.tagging_batch(chunk, lower, batch_size):
+                yield token
+        return
+
+    for chunk, results in map_chunks(tagger, texts, _tag_chunk, (lower, batch_size),
+                                     n_jobs, chunk_size, max_pending):
+        for text, (words, postags) in zip(chunk, results):
+            yield tagger._Token(text, lower, tagger.wakati, tagger._postagging,
+                                _words=words, _postags=postags)
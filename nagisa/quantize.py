@@ -0,0 +1,154 @@
+# -*- coding:utf-8 -*-
+"""
+Convert a trained model into an int8 model and compare it with the float model.
+
+The matrices of the model are quantized to int8 with a float32 scale per row
+(see np_model.save_quantized). The quantized model is loaded by the Tagger
+with engine='numpy':
+
+    $ python -m nagisa.quantize --vocabs sample.vocabs --params sample.params \\
+        --hp sample.hp --output sample.qparams --test sample.test
+
+    >>> tagger = nagisa.Tagger(vocabs='sample.vocabs', params='sample.qparams',
+    ...                        hp='sample.hp', engine='numpy')
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import json
+import time
+
+import nagisa_utils as utils
+import nagisa.np_model as np_model
+import nagisa.mecab_system_eval as mecab_system_eval
+from nagisa.tagger import Tagger
+
+
+def quantize(params, hp, output):
+    """Write the int8 model of a parameter file.
+
+    args:
+        - params (str): Path to a model parameter file (*.params).
+        - hp (str): Path to a hyper-parameter file (*.hp).
+        - output (str): Path to an output file.
+
+    return:
+        - str : The path to the output file.
+    """
+    arrays = np_model.export_arrays(utils.load_data(hp), params)
+    np_model.save_quantized(output, arrays)
+    return output
+
+
+def evaluate(tagger, test_file, delimiter='\t', newline='EOS', batch_size=32):
+    """Tag the sentences of a test file and evaluate the results with mecab_system_eval.
+
+    args:
+        - tagger (Tagger): The tagger to evaluate.
+        - test_file (str): Path to a test file in the format of the train file.
+        - delimiter (str, optional): Separate word and tag in each line by 'delimiter'.
+        - newline (str, optional): Separate lines in the file by 'newline'.
+        - batch_size (int, optional): The maximum number of sentences in a minibatch.
+
+    return:
+        - dict : The F1 scores of word segmentation and POS-tagging, \
+                 the seconds of tagging and the characters tagged per second.
+    """
+    def data_for_eval(words, postags):
+        sent = []
+        for w, p in zip(words, postags):
+            p = w+"\t"+p
+            if mecab_system_eval.PY_3 is True:
+                w = w.encode("UTF-8")
+                p = p.encode("UTF-8")
+            sent.append([w, p])
+        return sent
+
+    ans_data = []
+    texts = []
+    for words, postags in utils.iter_file(test_file, delimiter, newline):
+        ans_data.append(data_for_eval(words, postags))
+        texts.append(''.join(words))
+
+    t = time.time()
+    outputs = tagger.tagging_batch(texts, batch_size=batch_size)
+    seconds = time.time() - t
+
+    sys_data = [data_for_eval(output.words, output.postags) for output in outputs]
+    r = mecab_system_eval.mecab_eval(sys_data, ans_data)
+    _, _, ws_f, _, _, pos_f = mecab_system_eval.calculate_fvalues(r)
+    num_chars = sum(len(text) for text in texts)
+    return {'ws_f1': ws_f, 'pos_f1': pos_f, 'seconds': seconds,
+            'chars_per_sec': num_chars / seconds if seconds > 0 else 0.}
+
+
+def compare(vocabs, params, hp, quantized, test_file, delimiter='\t', newline='EOS',
+            batch_size=32):
+    """Compare the float model and the int8 model on a test file.
+
+    Both models are run with engine='numpy'. The memory is the size of
+    the arrays of the model, which does not include the vocabularies.
+
+    args:
+        - vocabs (str): Path to a vocabulary file (*.vocabs).
+        - params (str): Path to a model parameter file (*.params).
+        - hp (str): Path to a hyper-parameter file (*.hp).
+        - quantized (str): Path to the quantized model file of params.
+        - test_file (str): Path to a test file in the format of the train file.
+        - delimiter (str, optional): Separate word and tag in each line by 'delimiter'.
+        - newline (str, optional): Separate lines in the file by 'newline'.
+        - batch_size (int, optional): The maximum number of sentences in a minibatch.
+
+    return:
+        - dict : The results of 'float' and 'int8' (see evaluate) with \
+                 'model_bytes' and 'file_bytes', and their 'delta'.
+    """
+    report = {}
+    for name, fn in [('float', params), ('int8', quantized)]:
+        tagger = Tagger(vocabs=vocabs, params=fn, hp=hp, engine='numpy')
+        result = evaluate(tagger, test_file, delimiter, newline, batch_size)
+        result['model_bytes'] = sum(array.nbytes for array in tagger._model.arrays.values())
+        result['file_bytes'] = os.path.getsize(fn)
+        report[name] = result
+
+    f, q = report['float'], report['int8']
+    report['delta'] = {
+        'ws_f1': round(q['ws_f1'] - f['ws_f1'], 4),
+        'pos_f1': round(q['pos_f1'] - f['pos_f1'], 4),
+        'speed_ratio': q['chars_per_sec'] / f['chars_per_sec'] if f['chars_per_sec'] else 0.,
+        'model_bytes_ratio': q['model_bytes'] / f['model_bytes'],
+        'file_bytes_ratio': q['file_bytes'] / f['file_bytes'],
+    }
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--vocabs', type=str, help='Path to a vocabulary file (*.vocabs)')
+    parser.add_argument('--params', type=str, required=True,
+                        help='Path to a model parameter file (*.params)')
+    parser.add_argument('--hp', type=str, required=True,
+                        help='Path to a hyper-parameter file (*.hp)')
+    parser.add_argument('--output', type=str, required=True,
+                        help='Path to the quantized model file')
+    parser.add_argument('--test', type=str,
+                        help='Compare the float model and the quantized model on this file')
+    parser.add_argument('--delimiter', type=str, default='\t')
+    parser.add_argument('--newline', type=str, default='EOS')
+    parser.add_argument('--batch_size', type=int, default=32)
+    args = parser.parse_args(argv)
+
+    quantize(args.params, args.hp, args.output)
+    if args.test is not None:
+        if args.vocabs is None:
+            parser.error('--vocabs is required with --test')
+        report = compare(args.vocabs, args.params, args.hp, args.output, args.test,
+                         args.delimiter, args.newline, args.batch_size)
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import weakref
+import threading
+
+import nagisa_utils as utils
+import nagisa.np_model as np_model
+import nagisa.shared as shared
+
+
+# The loaded models are held only by the taggers using them,
+# so a model is freed when its last tagger is deleted.
+_models = weakref.WeakValueDictionary()
+_lock = threading.Lock()
+
+
+class LoadedModel(object):
+    """
+    The vocabularies and the networks of a model, which are shared by all taggers
+    of the same model in a process. The options of a tagger which do not change
+    the model (e.g., single_word_list, the caches) are not included.
+
+    args:
+        - vocabs (str): Path to a vocabulary file (*.vocabs).
+        - params (str): Path to a model parameter file (*.params).
+        - hp (str): Path to a hyper-parameter file (*.hp).
+        - engine (str): 'dynet' or 'numpy'.
+        - shared_dir (str): Path to a directory of the memory-mapped files, or None.
+        - max_word_length (int): The maximum length of the dictionary words.
+        - bundle (str): Path to a model bundle, or None.
+    """
+
+    def __init__(self, vocabs, params, hp, engine, shared_dir, max_word_length, bundle):
+        if engine not in ['dynet', 'numpy']:
+            raise ValueError("engine must be 'dynet' or 'numpy'.")
+
+        # Load vocaburary files
+        arrays = None
+        if bundle is not None:
+            # Imported here, so that python -m nagisa.bundle runs the module only once.
+            import nagisa.bundle as model_bundle
+            loaded = model_bundle.load(bundle)
+            vocabs, arrays = loaded.vocabs, loaded.arrays
+        elif shared_dir is not None:
+            vocabs, arrays = shared.load_model(shared_dir, vocabs, params, hp)
+        else:
+            vocabs = utils.load_data(vocabs)
+        self.uni2id, self.bi2id, self.word2id, self.pos2id, self.word2postags = vocabs
+        self.id2pos = {v:k for k, v in self.pos2id.items()}
+        # The dictionary words in the text are found with a trie,
+        # and the character-level features are looked up by codepoint.
+        if bundle is not None:
+            self.word_index = utils.WordIndex(max_length=max_word_length,
+                                              arrays=loaded.word_index)
+            self.char_table = utils.CharTable(arrays=loaded.char_table)
+        else:
+            self.word_index = utils.WordIndex(self.word2id, max_length=max_word_length)
+            self.char_table = utils.CharTable(self.uni2id, self.bi2id)
+        self.postags = sorted(self.pos2id, key=self.pos2id.get)
+        # Load a hyper-parameter file
+        if bundle is not None:
+            self.hp = loaded.hp
+        else:
+            self.hp = utils.load_data(hp)
+        # Construct a word segmentation model and a pos tagging model
+        if engine == 'dynet':
+            if bundle is None and np_model.is_quantized(params):
+                raise ValueError("A quantized model can be used only with engine='numpy'.")
+            # DyNet is imported only when the DyNet engine is used.
+            import nagisa.model as model
+            if bundle is not None:
+                self.model = model.Model(self.hp, arrays=arrays)
+            else:
+                self.model = model.Model(self.hp, params)
+        else:
+            self.model = np_model.NumpyModel(self.hp, params, arrays=arrays)
+
+
+def _file_identity(fn):
+    st = os.stat(fn)
+    return (os.path.realpath(fn), st.st_size, st.st_mtime)
+
+
+def model_key(vocabs, params, hp, engine='dynet', shared_dir=None, max_word_length=8,
+              bundle=None):
+    """Return the key of a model in the registry.
+
+    The files are identified by their real paths, sizes and mtimes,
+    so a model is loaded again if its files are modified.
+
+    args:
+        - See LoadedModel.
+
+    return:
+        - tuple : The key.
+    """
+    files = [bundle] if bundle is not None else [vocabs, params, hp]
+    if shared_dir is not None:
+        shared_dir = os.path.realpath(shared_dir)
+    return (tuple(_file_identity(fn) for fn in files), engine, shared_dir,
+            max_word_length)
+
+
+def get_model(vocabs, params, hp, engine='dynet', shared_dir=None, max_word_length=8,
+              bundle=None):
+    """Return the loaded model of the files, loading it if no tagger uses it.
+
+    args:
+        - See LoadedModel.
+
+    return:
+        - LoadedModel : The model.
+    """
+    key = model_key(vocabs, params, hp, engine, shared_dir, max_word_length, bundle)
+    # The lock is held while a model is loaded,
+    # so that two threads do not load the same model.
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = LoadedModel(vocabs, params, hp, engine, shared_dir,
+                                max_word_length, bundle)
+            _models[key] = model
+    return model
+
+
+def loaded_models():
+    """Return the keys of the models used by the taggers in this process."""
+    with _lock:
+        return list(_models.keys())
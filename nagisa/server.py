@@ -0,0 +1,303 @@
+# -*- coding:utf-8 -*-
+"""
+A local server which keeps the taggers loaded and tags the sentences sent over
+a Unix domain socket, so that short-lived processes do not load the model.
+
+    $ python -m nagisa serve --bundle nagisa_v001.nagisa --engine numpy
+    $ python -m nagisa serve --model ud=ud.nagisa
+
+The protocol and the client are in nagisa.client.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import sys
+import stat
+import time
+import errno
+import signal
+import socket
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from nagisa.tagger import Tagger
+from nagisa.cli import add_model_arguments, build_tagger
+from nagisa.client import default_socket_path, send_message, recv_message
+
+
+class Server(object):
+    """
+    The requests of all connections are put into one queue, and a worker thread
+    tags the requests which arrive within max_delay seconds together, grouped
+    by the model, the method and the lower option. A connection is handled by
+    its own thread, and waits for the response to a request before reading the next.
+
+    args:
+        - taggers (dict or Tagger): The taggers by model name. \
+                                    A Tagger is served as the model 'default'.
+        - path (str, optional): Path to the socket. The default is default_socket_path().
+        - max_delay (float, optional): The maximum seconds a request waits for other requests.
+        - max_batch_size (int, optional): The maximum number of sentences tagged together.
+        - batch_size (int, optional): The maximum number of sentences in a minibatch.
+    """
+
+    def __init__(self, taggers, path=None, max_delay=0.002, max_batch_size=1024,
+                 batch_size=32):
+        if not isinstance(taggers, dict):
+            taggers = {'default': taggers}
+        if max_delay < 0:
+            raise ValueError("max_delay must be a non-negative number.")
+        self.taggers = taggers
+        self.path = path if path is not None else default_socket_path()
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue()
+        self._listener = None
+        self._threads = []
+        self._stopped = threading.Event()
+        self._num_requests = 0
+        self._num_texts = 0
+        self._num_groups = 0
+
+    def start(self):
+        """Listen on the socket and start the threads. Return the server."""
+        self._remove_stale_socket()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(64)
+        self._listener = listener
+        for target in [self._accept, self._work]:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def serve_forever(self):
+        """Start the server and serve until shutdown() is called or the process is interrupted."""
+        if self._listener is None:
+            self.start()
+        try:
+            while not self._stopped.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop accepting connections, finish the queued requests and remove the socket."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            try:
+                listener.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            listener.close()
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def info(self):
+        """Return the models and the counters of the server."""
+        return {'models': sorted(self.taggers), 'requests': self._num_requests,
+                'texts': self._num_texts, 'groups': self._num_groups}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _remove_stale_socket(self):
+        # A socket file left by a server which is not running is removed.
+        if not os.path.exists(self.path):
+            return
+        # Any other file (e.g., a path given by mistake) is not removed.
+        if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+            raise RuntimeError('{} exists and is not a socket.'.format(self.path))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except socket.error:
+            os.unlink(self.path)
+        else:
+            raise RuntimeError('A server is already running on {}.'.format(self.path))
+        finally:
+            sock.close()
+
+    def _accept(self):
+        listener = self._listener
+        while not self._stopped.is_set():
+            try:
+                conn, _ = listener.accept()
+            except socket.error:
+                break
+            thread = threading.Thread(target=self._handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, conn):
+        try:
+            while True:
+                try:
+                    request = recv_message(conn)
+                except ValueError as e:
+                    send_message(conn, {'error': str(e)})
+                    break
+                if request is None:
+                    break
+                send_message(conn, self._dispatch(request))
+        except socket.error as e:
+            if e.errno not in (errno.EPIPE, errno.ECONNRESET):
+                raise
+        finally:
+            conn.close()
+
+    def _dispatch(self, request):
+        if not isinstance(request, dict):
+            return {'error': 'A request must be an object.'}
+        method = request.get('method')
+        if method == 'info':
+            return {'results': self.info()}
+        if method not in _METHODS:
+            return {'error': 'Unknown method: {}'.format(method)}
+        model = request.get('model', 'default')
+        if model not in self.taggers:
+            return {'error': 'Unknown model: {}'.format(model)}
+        texts = request.get('texts')
+        if not isinstance(texts, list):
+            return {'error': 'texts must be a list of strings.'}
+
+        pending = _Request((model, method, bool(request.get('lower', False))), texts)
+        self._queue.put(pending)
+        pending.done.wait()
+        return pending.response
+
+    def _work(self):
+        stopped = False
+        while not stopped:
+            pending = self._queue.get()
+            if pending is None:
+                break
+            requests = [pending]
+            num_texts = len(pending.texts)
+            deadline = time.time() + self.max_delay
+            while num_texts < self.max_batch_size:
+                try:
+                    pending = self._queue.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stopped = True
+                    break
+                requests.append(pending)
+                num_texts += len(pending.texts)
+
+            groups = {}
+            for pending in requests:
+                groups.setdefault(pending.key, []).append(pending)
+            for key, group in groups.items():
+                self._tag_group(key, group)
+
+    def _tag_group(self, key, group):
+        model, method, lower = key
+        tag_batch = _METHODS[method]
+        tagger = self.taggers[model]
+        self._num_requests += len(group)
+        self._num_groups += 1
+        try:
+            texts = [text for pending in group for text in pending.texts]
+            results = tag_batch(tagger, texts, lower, self.batch_size)
+        except Exception:
+            # If a request raises an error, the requests are tagged
+            # one by one, so that the error is returned only to its client.
+            results = None
+        start = 0
+        for pending in group:
+            self._num_texts += len(pending.texts)
+            if results is not None:
+                pending.response = {'results': results[start:start+len(pending.texts)]}
+                start += len(pending.texts)
+            else:
+                try:
+                    pending.response = {'results': tag_batch(tagger, pending.texts, lower,
+                                                             self.batch_size)}
+                except Exception as e:
+                    pending.response = {'error': '{}: {}'.format(type(e).__name__, e)}
+            pending.done.set()
+
+
+class _Request(object):
+    __slots__ = ('key', 'texts', 'done', 'response')
+
+    def __init__(self, key, texts):
+        self.key = key
+        self.texts = texts
+        self.done = threading.Event()
+        self.response = None
+
+
+def _wakati(tagger, texts, lower, batch_size):
+    return tagger.wakati_batch(texts, lower, batch_size)
+
+
+def _tagging(tagger, texts, lower, batch_size):
+    return [[token.words, token.postags]
+            for token in tagger.tagging_batch(texts, lower, batch_size)]
+
+
+_METHODS = {'wakati': _wakati, 'tagging': _tagging}
+
+
+def _parse_model(value):
+    name, sep, bundle = value.partition('=')
+    if not sep or not name or not bundle:
+        raise ValueError('A model must be given as NAME=BUNDLE.')
+    return name, bundle
+
+
+def _exit(signum, frame):
+    sys.exit(0)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m nagisa serve',
+                                     description='Serve the taggers over a Unix domain socket.')
+    parser.add_argument('--socket', type=str, default=None, help='Path to the socket')
+    parser.add_argument('--model', type=_parse_model, action='append', default=[],
+                        metavar='NAME=BUNDLE', help='Serve another model bundle as NAME')
+    add_model_arguments(parser)
+    parser.add_argument('--max_delay', type=float, default=0.002)
+    parser.add_argument('--batch_size', type=int, default=32)
+    args = parser.parse_args(argv)
+
+    taggers = {'default': build_tagger(args)}
+    for name, bundle in args.model:
+        taggers[name] = Tagger(bundle=bundle, engine=args.engine)
+
+    server = Server(taggers, args.socket, max_delay=args.max_delay,
+                    batch_size=args.batch_size).start()
+    # The socket is removed when the server is terminated.
+    signal.signal(signal.SIGTERM, _exit)
+    print('nagisa: serving {} on {}'.format(', '.join(sorted(taggers)), server.path),
+          file=sys.stderr)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
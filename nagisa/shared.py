@@ -0,0 +1,144 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+import nagisa_utils as utils
+import nagisa.np_model as np_model
+
+
+def model_key(vocabs, params, hp):
+    """Return a key which identifies the model files by their paths, sizes and mtimes.
+
+    args:
+        - vocabs (str): Path to a vocabulary file.
+        - params (str): Path to a model parameter file.
+        - hp (str): Path to a hyper-parameter file.
+
+    return:
+        - str : The hexadecimal digest.
+    """
+    h = hashlib.sha1()
+    for fn in [vocabs, params, hp]:
+        st = os.stat(fn)
+        h.update('{}\0{}\0{}\0'.format(os.path.realpath(fn), st.st_size,
+                                       st.st_mtime).encode('utf-8'))
+    return h.hexdigest()
+
+
+def export_model(shared_dir, vocabs, params, hp):
+    """Write the arrays of a model into shared_dir, unless they have been written.
+
+    The large arrays are saved as .npy files, so that they can be memory-mapped
+    by load_model() and shared by all processes on the host.
+
+    args:
+        - shared_dir (str): Path to a directory for the shared files.
+        - vocabs (str): Path to a vocabulary file.
+        - params (str): Path to a model parameter file.
+        - hp (str): Path to a hyper-parameter file.
+
+    return:
+        - str : Path to the directory of the model.
+    """
+    path = os.path.join(shared_dir, model_key(vocabs, params, hp))
+    if os.path.isdir(path):
+        return path
+
+    if not os.path.isdir(shared_dir):
+        os.makedirs(shared_dir)
+    # Write into a temporary directory and rename it,
+    # so that other processes never see a partial model.
+    tmp = tempfile.mkdtemp(dir=shared_dir, prefix='.tmp')
+    try:
+        uni2id, bi2id, word2id, pos2id, word2postags = utils.load_data(vocabs)
+        utils.dump_data([uni2id, bi2id, word2id, pos2id], os.path.join(tmp, 'vocabs'))
+        utils.StringTable.from_dict(word2postags).save(os.path.join(tmp, 'word2postags'))
+
+        arrays = np_model.load_arrays(utils.load_data(hp), params)
+        items = []
+        for name, array in sorted(arrays.items()):
+            # A quantized table is saved as its int8 values and scales.
+            if isinstance(array, np_model.QuantizedTable):
+                items += [(name+'.q', array.q), (name+'.scale', array.scale)]
+            else:
+                items.append((name, np.asarray(array)))
+        utils.dump_data([name for name, _ in items], os.path.join(tmp, 'arrays'))
+        for i, (_, array) in enumerate(items):
+            np.save(os.path.join(tmp, '{}.npy'.format(i)), array)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process has exported the same model.
+            if not os.path.isdir(path):
+                raise
+    finally:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+    return path
+
+
+def load_model(shared_dir, vocabs, params, hp):
+    """Load a model from shared_dir. The model is exported first if necessary.
+
+    args:
+        - shared_dir (str): Path to a directory for the shared files.
+        - vocabs (str): Path to a vocabulary file.
+        - params (str): Path to a model parameter file.
+        - hp (str): Path to a hyper-parameter file.
+
+    return:
+        - list : The vocabularies in the order of a vocabulary file. \
+                 word2postags is a memory-mapped StringTable.
+        - dict : The memory-mapped arrays of the model (see np_model.export_arrays). \
+                 The tables of a quantized model are QuantizedTable.
+    """
+    path = export_model(shared_dir, vocabs, params, hp)
+    vocabs = utils.load_data(os.path.join(path, 'vocabs'))
+    vocabs.append(utils.StringTable.load(os.path.join(path, 'word2postags')))
+
+    names = utils.load_data(os.path.join(path, 'arrays'))
+    arrays = {name: np.load(os.path.join(path, '{}.npy'.format(i)), mmap_mode='r')
+              for i, name in enumerate(names)}
+    for name in [name for name in names if name.endswith('.q')]:
+        table = name[:-len('.q')]
+        arrays[table] = np_model.QuantizedTable(arrays.pop(name), arrays.pop(table+'.scale'))
+    return vocabs, arrays
+
+
+def load_word_index(shared_dir, words):
+    """Load the trie of the words from shared_dir, or build and save it.
+
+    args:
+        - shared_dir (str): Path to a directory for the shared files.
+        - words (list): The words of the trie.
+
+    return:
+        - WordIndex : The trie. The id of each word is its index in the sorted words.
+    """
+    words = sorted(set(words))
+    h = hashlib.sha1(json.dumps(words, ensure_ascii=False).encode('utf-8'))
+    path = os.path.join(shared_dir, 'words-{}.npz'.format(h.hexdigest()))
+    if os.path.exists(path):
+        return utils.WordIndex.load(path)
+
+    word_index = utils.WordIndex({w: i for i, w in enumerate(words)},
+                                 max_length=max(len(w) for w in words))
+    if not os.path.isdir(shared_dir):
+        os.makedirs(shared_dir)
+    fd, tmp = tempfile.mkstemp(dir=shared_dir, prefix='.tmp', suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            word_index.save(f)
+        os.rename(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return word_index
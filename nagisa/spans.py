@@ -0,0 +1,162 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+
+import nagisa_utils as utils
+
+
+class Spans(object):
+    """
+    The words of a sentence as character offsets into the original text,
+    with the POS-tag ids of the words (see Tagger.tagging_spans).
+    The strings of the words and the POS-tags are made only when they are used.
+
+    args:
+        - text (str): The original text.
+        - offsets (numpy.ndarray): The (start, end) offsets of the words, \
+                                   an int32 array of the shape (words, 2).
+        - pos_ids (numpy.ndarray): The POS-tag ids of the words, an int32 array.
+        - postag_names (list): The POS-tags indexed by id.
+
+    A word inside one character which the normalization expands (e.g., '㍻')
+    has the offsets of the whole character.
+    """
+
+    __slots__ = ('text', 'offsets', 'pos_ids', 'postag_names')
+
+    def __init__(self, text, offsets, pos_ids, postag_names):
+        self.text = text
+        self.offsets = offsets
+        self.pos_ids = pos_ids
+        self.postag_names = postag_names
+
+    @property
+    def starts(self):
+        return self.offsets[:, 0]
+
+    @property
+    def ends(self):
+        return self.offsets[:, 1]
+
+    @property
+    def words(self):
+        """The surfaces of the words in the original text."""
+        text = self.text
+        return [text[s:e] for s, e in self.offsets.tolist()]
+
+    @property
+    def postags(self):
+        names = self.postag_names
+        return [names[pid] for pid in self.pos_ids.tolist()]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def mask(self, postags):
+        """Return a boolean array which is True for the words with the POS-tags."""
+        postags = set(postags)
+        table = np.array([name in postags for name in self.postag_names], dtype=bool)
+        return table[self.pos_ids]
+
+    def filter(self, postags):
+        """Return the spans without the words with the POS-tags."""
+        return self.select(~self.mask(postags))
+
+    def extract(self, postags):
+        """Return the spans of the words with the POS-tags."""
+        return self.select(self.mask(postags))
+
+    def select(self, indice):
+        """Return the spans of the words selected by a boolean mask or indice."""
+        return Spans(self.text, self.offsets[indice], self.pos_ids[indice], self.postag_names)
+
+    def __str__(self):
+        return ' '.join([w+'/'+p for w, p in zip(self.words, self.postags)])
+
+    def __repr__(self):
+        return '<Spans: {} words>'.format(len(self))
+
+
+def align(text, preprocessed, prenormalized=False):
+    """Map the positions of a preprocessed text to the positions of the original text.
+
+    The preprocessing (see nagisa_utils.preprocess) can change the number of
+    characters, e.g., 'ｶﾞ' becomes 'ガ' and '㍻' becomes '平成'. The original text
+    is divided into the shortest pieces which are preprocessed independently.
+
+    args:
+        - text (str): The original text.
+        - preprocessed (str): The preprocessed text.
+        - prenormalized (bool, optional): See Tagger.
+
+    return:
+        - numpy.ndarray : The original position of the piece of each preprocessed \
+                          character, for the start of a word.
+        - numpy.ndarray : The original end of the piece of each preprocessed \
+                          character, for the end of a word.
+    """
+    length = len(preprocessed)
+    # The preprocessing of a prenormalized or ASCII text only replaces characters.
+    if (prenormalized or text[:length] == preprocessed or
+            len(text.encode('utf-8', 'surrogatepass')) == len(text)):
+        positions = np.arange(length, dtype=np.int32)
+        return positions, positions + 1
+
+    starts = np.zeros(length, dtype=np.int32)
+    ends = np.zeros(length, dtype=np.int32)
+    i = p = 0
+    while p < length:
+        j = i + 1
+        while j <= len(text):
+            piece = utils.preprocess_without_rstrip(text[i:j], prenormalized)
+            if len(piece) > 0 and preprocessed.startswith(piece, p):
+                break
+            j += 1
+        else:
+            # The rest of the text is mapped as one piece.
+            j, piece = len(text.rstrip()), preprocessed[p:]
+        starts[p:p+len(piece)] = i
+        ends[p:p+len(piece)] = j
+        i, p = j, p + len(piece)
+    return starts, ends
+
+
+def from_words(text, preprocessed, words, pos_ids, postag_names, lower=False,
+               prenormalized=False):
+    """Return the Spans of the words of a preprocessed text.
+
+    args:
+        - text (str): The original text.
+        - preprocessed (str): The preprocessed text.
+        - words (list): The words of the preprocessed text.
+        - pos_ids (list): The POS-tag ids of the words.
+        - postag_names (list): The POS-tags indexed by id.
+        - lower (bool, optional): If lower is True, the words are those of the \
+                                  lowercased text.
+        - prenormalized (bool, optional): See Tagger.
+
+    return:
+        - Spans : The spans of the words.
+    """
+    haystack = preprocessed.lower() if lower is True else preprocessed
+    bounds = []
+    # The words are usually contiguous, but the segmentation can skip
+    # characters, so each word is searched from the end of the last word.
+    pos = 0
+    for word in words:
+        start = haystack.find(word, pos)
+        if start < 0:
+            start = pos
+        pos = start + len(word)
+        bounds.append((start, pos))
+
+    offsets = np.array(bounds, dtype=np.int32).reshape(-1, 2)
+    if len(words) > 0:
+        last = len(preprocessed) - 1
+        starts, piece_ends = align(text, preprocessed, prenormalized)
+        first = np.minimum(offsets[:, 0], last)
+        offsets[:, 1] = piece_ends[np.clip(offsets[:, 1] - 1, first, last)]
+        offsets[:, 0] = starts[first]
+    return Spans(text, offsets, np.asarray(pos_ids, dtype=np.int32), postag_names)
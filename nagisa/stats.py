@@ -0,0 +1,213 @@
+# -*- coding:utf-8 -*-
+
+from __future__ import division, print_function, absolute_import
+
+import time
+import bisect
+
+timer = getattr(time, 'perf_counter', time.time)
+
+# The upper bounds (seconds) of the buckets of the histograms.
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """
+    A histogram of the observed values with fixed buckets, as in Prometheus.
+
+    args:
+        - buckets (tuple, optional): The sorted upper bounds of the buckets. \
+                                     A bucket of +Inf is added.
+    """
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        """Add the values observed by another histogram of the same buckets."""
+        if other.buckets != self.buckets:
+            raise ValueError('The buckets of the histograms are different.')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def cumulative_counts(self):
+        """Return the (upper bound, the number of values <= upper bound) of each bucket."""
+        total = 0
+        counts = []
+        for le, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            counts.append((le, total))
+        return counts
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket of the q-quantile (0 <= q <= 1)."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        for le, total in self.cumulative_counts():
+            if total >= rank:
+                return le
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': [[le, total] for le, total in self.cumulative_counts()]}
+
+
+class _Stage(object):
+    __slots__ = ('seconds', 'chars', 'tokens')
+
+    def __init__(self, buckets):
+        self.seconds = Histogram(buckets)
+        self.chars = 0
+        self.tokens = 0
+
+
+class TaggerStats(object):
+    """
+    The wall time of the stages of a Tagger, the numbers of the characters and
+    the words processed by each stage, and the counters of the events
+    (see Tagger.enable_stats).
+
+    The stages are 'preprocess', 'feature_extraction', 'encode_ws' (the word
+    segmentation network), 'viterbi', 'segment', 'postagging_inputs' and
+    'encode_pt' (the POS-tagging network). A stage of a minibatch is observed once.
+    The events are 'sentences', 'cache_hits', 'cache_misses', 'ws_graphs'
+    and 'pt_graphs' (the forward passes of the networks, each of which is
+    one computation graph with DyNet).
+
+    args:
+        - buckets (tuple, optional): The upper bounds (seconds) of the histograms.
+        - hooks (list, optional): Functions called as hook(stage, seconds, chars, tokens) \
+                                  for each observation.
+
+    The stats are not locked, so a TaggerStats should be used by one thread
+    at a time, like a Tagger. The stats of the worker processes of
+    Tagger.tagging_many are merged into the stats of the tagger.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, hooks=None):
+        self.buckets = tuple(buckets)
+        self.hooks = list(hooks) if hooks else []
+        self.reset()
+
+    def reset(self):
+        """Clear all observations and counters."""
+        self.stages = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def observe(self, stage, seconds, chars=0, tokens=0):
+        """Record the wall time of a stage and the numbers of the characters and the words."""
+        s = self.stages.get(stage)
+        if s is None:
+            s = self.stages[stage] = _Stage(self.buckets)
+        s.seconds.observe(seconds)
+        s.chars += chars
+        s.tokens += tokens
+        for hook in self.hooks:
+            hook(stage, seconds, chars, tokens)
+
+    def lap(self, stage, start, chars=0, tokens=0):
+        """Observe the time since start (a value of timer()) and return the current time."""
+        now = timer()
+        self.observe(stage, now - start, chars, tokens)
+        return now
+
+    def count(self, event, n=1):
+        self.counters[event] = self.counters.get(event, 0) + n
+
+    def merge(self, other):
+        """Add the observations and the counters of another TaggerStats of the same
+        buckets (e.g., the stats of a worker process). The hooks are not called.
+        """
+        for name, o in other.stages.items():
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = _Stage(self.buckets)
+            s.seconds.merge(o.seconds)
+            s.chars += o.chars
+            s.tokens += o.tokens
+        for event, n in other.counters.items():
+            self.count(event, n)
+
+    def to_dict(self):
+        """Return the stats as a dict, which can be serialized as JSON."""
+        stages = {}
+        for name, s in self.stages.items():
+            stage = s.seconds.to_dict()
+            stage['buckets'] = [[None if le == float('inf') else le, total]
+                                for le, total in stage['buckets']]
+            stage.update({'chars': s.chars, 'tokens': s.tokens,
+                          'p50': s.seconds.quantile(0.5), 'p99': s.seconds.quantile(0.99)})
+            if stage['p99'] == float('inf'):
+                stage['p99'] = None
+            stages[name] = stage
+        return {'stages': stages, 'counters': dict(self.counters),
+                'uptime': time.time() - self.started}
+
+    def to_prometheus(self, prefix='nagisa', labels=None):
+        """Return the stats in the Prometheus text exposition format.
+
+        args:
+            - prefix (str, optional): The prefix of the metric names.
+            - labels (dict, optional): The labels added to all metrics (e.g., the model name).
+
+        return:
+            - str : The metrics.
+        """
+        base = ''.join(['{}="{}",'.format(k, _escape(v)) for k, v in sorted((labels or {}).items())])
+        lines = ['# HELP {}_stage_seconds The wall time of the tagging stages.'.format(prefix),
+                 '# TYPE {}_stage_seconds histogram'.format(prefix)]
+        for name, s in sorted(self.stages.items()):
+            label = '{}stage="{}"'.format(base, _escape(name))
+            for le, total in s.seconds.cumulative_counts():
+                le = '+Inf' if le == float('inf') else repr(le)
+                lines.append('{}_stage_seconds_bucket{{{},le="{}"}} {}'.format(prefix, label,
+                                                                               le, total))
+            lines.append('{}_stage_seconds_sum{{{}}} {!r}'.format(prefix, label, s.seconds.sum))
+            lines.append('{}_stage_seconds_count{{{}}} {}'.format(prefix, label, s.seconds.count))
+        for unit in ['chars', 'tokens']:
+            lines += ['# HELP {}_stage_{}_total The number of the {} processed by the stages.'
+                      .format(prefix, unit, 'characters' if unit == 'chars' else 'words'),
+                      '# TYPE {}_stage_{}_total counter'.format(prefix, unit)]
+            for name, s in sorted(self.stages.items()):
+                lines.append('{}_stage_{}_total{{{}stage="{}"}} {}'.format(
+                    prefix, unit, base, _escape(name), getattr(s, unit)))
+        lines += ['# HELP {}_events_total The numbers of the events.'.format(prefix),
+                  '# TYPE {}_events_total counter'.format(prefix)]
+        for name, n in sorted(self.counters.items()):
+            lines.append('{}_events_total{{{}event="{}"}} {}'.format(prefix, base,
+                                                                   _escape(name), n))
+        return '\n'.join(lines) + '\n'
+
+
+class NullStats(object):
+    """The stats of a Tagger whose stats are disabled, which record nothing."""
+
+    def observe(self, stage, seconds, chars=0, tokens=0):
+        pass
+
+    def lap(self, stage, start, chars=0, tokens=0):
+        return start
+
+    def count(self, event, n=1):
+        pass
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
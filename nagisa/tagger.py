@@ -2,12 +2,19 @@
 
 from __future__ import division, print_function, absolute_import
 
+import io
 import os
 import re
 import sys
 
 import nagisa_utils as utils
-import nagisa.model as model
+import nagisa.parallel as parallel
+import nagisa.shared as shared
+import nagisa.registry as registry
+import nagisa.spans as nagisa_spans
+from nagisa.cache import LRUCache, SQLiteCache, model_fingerprint
+from nagisa.stats import TaggerStats, NullStats, timer
+from nagisa.tokens import Token
 
 base = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(base)
@@ -16,9 +23,62 @@ sys.path.append(base)
 class Tagger(object):
     """
     This class has a word segmentation function and a POS-tagging function for Japanese.
+
+    args:
+        - vocabs (str, optional): Path to a vocabulary file (*.vocabs).
+        - params (str, optional): Path to a model parameter file (*.params), \
+                                  or a quantized model file (see nagisa.quantize), \
+                                  which is used with engine='numpy'.
+        - hp (str, optional): Path to a hyper-parameter file (*.hp).
+        - single_word_list (list, optional): Words (or regular expressions) \
+                                             recognized as a single word forcibly.
+        - cache_size (int, optional): If cache_size > 0, the results of word segmentation \
+                                      and POS-tagging are memoized in an LRU cache \
+                                      of this size. See cache_info().
+        - cache_path (str, optional): Path to a SQLite database used as a persistent \
+                                      cache shared by processes and runs.
+        - cache_max_entries (int, optional): The maximum number of entries \
+                                             in the persistent cache.
+        - engine (str, optional): 'dynet' (default) runs the model with DyNet. \
+                                  'numpy' runs the model only with NumPy \
+                                  and does not require DyNet.
+        - max_length (int, optional): If max_length is set, a sentence longer than \
+                                      max_length characters is split at sentence \
+                                      punctuation, or into overlapping windows, \
+                                      and the chunks are tagged as a minibatch.
+        - chunk_overlap (int, optional): The number of characters shared by \
+                                         two windows, at most max_length/2.
+        - max_word_length (int, optional): The maximum length of the dictionary words \
+                                           used as the features of word segmentation.
+        - prenormalized (bool, optional): If prenormalized is True, the inputs are \
+                                          assumed to be NFKC-normalized already, \
+                                          and the normalization is skipped.
+        - shared_dir (str, optional): Path to a directory where the model is stored \
+                                      as memory-mapped files. The taggers of all \
+                                      processes using the directory share one copy \
+                                      of the POS-tag dictionary (and the weights \
+                                      with engine='numpy').
+        - bundle (str, optional): Path to a model bundle (see nagisa.bundle), \
+                                  which is used instead of vocabs, params and hp. \
+                                  The bundle is memory-mapped, so the model is \
+                                  loaded without building the vocabularies.
+        - stats (bool or TaggerStats, optional): If stats is given, the wall time \
+                                                 of each stage is recorded \
+                                                 (see enable_stats()).
+
+    The taggers of the same model files and engine in a process share one copy
+    of the vocabularies and the networks (see nagisa.registry), so a tagger
+    which differs only in single_word_list or the caches is cheap to build.
+
+    A tagger can be pickled. It is rebuilt from the constructor arguments,
+    so it is cheap to send to a process when shared_dir is used.
     """
 
-    def __init__(self, vocabs=None, params=None, hp=None, single_word_list=None):
+    def __init__(self, vocabs=None, params=None, hp=None, single_word_list=None,
+                 cache_size=0, cache_path=None, cache_max_entries=None,
+                 engine='dynet', shared_dir=None, max_length=None, chunk_overlap=32,
+                 max_word_length=8, prenormalized=False, bundle=None,
+                 stats=None):
         if vocabs is None:
             vocabs = base + '/data/nagisa_v001.dict'
         if params is None:
@@ -26,27 +86,52 @@ class Tagger(object):
         if hp is None:
             hp = base + '/data/nagisa_v001.hp'
 
-        # Load vocaburary files
-        vocabs = utils.load_data(vocabs)
-        self._uni2id, self._bi2id, self._word2id, self._pos2id, self._word2postags = vocabs
-        self._id2pos = {v:k for k, v in self._pos2id.items()}
+        # Keep the arguments to build the same tagger in worker processes.
+        self._init_args = {'vocabs': vocabs, 'params': params, 'hp': hp,
+                           'single_word_list': single_word_list,
+                           'cache_size': cache_size, 'cache_path': cache_path,
+                           'cache_max_entries': cache_max_entries,
+                           'engine': engine, 'shared_dir': shared_dir,
+                           'max_length': max_length, 'chunk_overlap': chunk_overlap,
+                           'max_word_length': max_word_length,
+                           'prenormalized': prenormalized, 'bundle': bundle}
+
+        # The vocabularies and the networks are shared by the taggers
+        # of the same model files in this process.
+        self._loaded_model = registry.get_model(vocabs, params, hp, engine, shared_dir,
+                                                max_word_length, bundle)
+        loaded = self._loaded_model
+        self._uni2id, self._bi2id, self._word2id = loaded.uni2id, loaded.bi2id, loaded.word2id
+        self._pos2id, self._word2postags = loaded.pos2id, loaded.word2postags
+        self._id2pos = loaded.id2pos
         self.id2pos  = self._id2pos
-        self.postags = [postag for postag in self._pos2id.keys()]
-        # Load a hyper-parameter file
-        self._hp = utils.load_data(hp)
-        # Construct a word segmentation model and a pos tagging model
-        self._model = model.Model(self._hp, params)
+        self._word_index = loaded.word_index
+        self._char_table = loaded.char_table
+        self.postags = list(loaded.postags)
+        self._hp = loaded.hp
+        self._model = loaded.model
 
         # If a word is included in the single_word_list,
         # it is recognized as a single word forcibly.
+        # The literal words are matched with a trie, which is stored in
+        # shared_dir if it is given, and the other words are regular expressions.
         self.pattern = None
+        self._single_word_index = None
         if single_word_list:
             single_word_list = [utils.preprocess(w) for w in single_word_list if len(w) > 1]
+            literal_words = [w for w in single_word_list if not _REGEX_META.search(w)]
             single_word_list = [w.replace('(', '\(').replace(')', '\)')
-                                for w in single_word_list]
+                                for w in single_word_list if _REGEX_META.search(w)]
             single_word_list = sorted(single_word_list, key=lambda x:-len(x))
             if len(single_word_list) > 0:
                 self.pattern = re.compile('|'.join(single_word_list))
+            if len(literal_words) > 0:
+                if shared_dir is not None:
+                    self._single_word_index = shared.load_word_index(shared_dir, literal_words)
+                else:
+                    self._single_word_index = utils.WordIndex(
+                        {w: i for i, w in enumerate(literal_words)},
+                        max_length=max(len(w) for w in literal_words))
 
         # If use_noun_heuristic is True, nouns are more lilely to appear.
         if u'名詞' in self._pos2id:
@@ -54,6 +139,59 @@ class Tagger(object):
         else:
             self.use_noun_heuristic = False
 
+        # The preprocessed words of decode() are memoized.
+        self.prenormalized = prenormalized
+        self._word_memo = {}
+        # The POS-tags indexed by id, for tagging_spans().
+        self._postag_names = [self._id2pos.get(i) for i in range(max(self._id2pos)+1)]
+
+        # The long sentences are tagged in chunks to bound the memory usage.
+        if max_length is not None:
+            if max_length < 1:
+                raise ValueError("max_length must be a positive integer.")
+            if chunk_overlap < 0 or 2 * chunk_overlap > max_length:
+                raise ValueError("chunk_overlap must be between 0 and max_length/2.")
+        self.max_length = max_length
+        self.chunk_overlap = chunk_overlap
+
+        # The results depend on the model and the single_word_list,
+        # so each tagger has its own cache.
+        self._cache = None
+        if cache_size > 0:
+            self._cache = LRUCache(cache_size)
+
+        # The entries of the persistent cache are keyed by the fingerprint
+        # of the model files, the single_word_list and the options
+        # which change the results.
+        self._persistent_cache = None
+        if cache_path is not None:
+            if bundle is not None:
+                model_files = [bundle, None, None]
+            else:
+                model_files = [self._init_args['vocabs'], self._init_args['params'],
+                               self._init_args['hp']]
+            options = {name: self._init_args[name] for name in _RESULT_OPTIONS}
+            fingerprint = model_fingerprint(
+                *model_files, single_word_list=self._init_args['single_word_list'],
+                options=options)
+            self._persistent_cache = SQLiteCache(cache_path, fingerprint,
+                                                 max_entries=cache_max_entries)
+
+        # The stages record into self._stats, which is a NullStats
+        # unless the stats are enabled.
+        self.stats = None
+        self._stats = _NULL_STATS
+        if stats:
+            self.enable_stats(None if stats is True else stats)
+
+
+    def __getstate__(self):
+        return self._init_args
+
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
 
     def wakati(self, text, lower=False):
         """Word segmentation function. Return the segmented words.
@@ -66,23 +204,158 @@ class Tagger(object):
         return:
             - words (list): A list of the words.
         """
-        text = utils.preprocess(text)
+        stats = self._stats
+        t = timer()
+        stats.count('sentences')
+        text = utils.preprocess(text, self.prenormalized)
+        stats.lap('preprocess', t, len(text))
+        if self._is_long(len(text)):
+            return self._wakati_long(text, lower)
+
+        key = ('wakati', text, lower)
+        words = self._cache_get_many([key])[0]
+        if words is not None:
+            return words
+
         lower_text = text.lower()
-        feats = utils.feature_extraction(text=lower_text,
-                                         uni2id=self._uni2id,
-                                         bi2id=self._bi2id,
-                                         dictionary=self._word2id,
-                                         window_size=self._hp['WINDOW_SIZE'])
-        obs  = self._model.encode_ws(feats)
-        obs  = [ob.npvalue() for ob in obs]
+        t = timer()
+        feats = self._feature_extraction(lower_text)
+        t = stats.lap('feature_extraction', t, len(text))
+        obs  = self._model.ws_observations(feats)
+        t = stats.lap('encode_ws', t, len(text))
+        stats.count('ws_graphs')
         tags = utils.np_viterbi(self._model.trans_array, obs)
+        t = stats.lap('viterbi', t, len(text))
+        words = self._segment(text, lower_text, tags, lower)
+        stats.lap('segment', t, len(text), len(words))
+        self._cache_put_many([(key, words)])
+        return words
+
+
+    def wakati_batch(self, texts, lower=False, batch_size=32):
+        """Word segmentation function for multiple sentences.
+        Return the segmented words of each sentence in the input order.
+
+        The sentences are bucketed by length and each bucket is encoded
+        as one minibatch, so the result is the same as calling wakati()
+        for each sentence.
+
+        args:
+            - texts (list): Input sentences (a list or an iterable of str).
+            - lower (bool): If lower is True, all uppercase characters in a list \
+                            of the words are converted into lowercase characters.
+            - batch_size (int): The maximum number of sentences in a minibatch.
+
+        return:
+            - words_list (list): A list of the lists of words.
+        """
+        texts = self._preprocess_batch(texts)
+        return self._wakati_preprocessed(texts, lower, batch_size)
+
+
+    def _preprocess_batch(self, texts):
+        t = timer()
+        texts = [utils.preprocess(text, self.prenormalized) for text in texts]
+        self._stats.lap('preprocess', t, sum(len(text) for text in texts))
+        self._stats.count('sentences', len(texts))
+        return texts
+
+
+    def _wakati_preprocessed(self, texts, lower=False, batch_size=32):
+        # The long texts are split into chunks.
+        long_indice = [i for i, text in enumerate(texts) if self._is_long(len(text))]
+        if not long_indice:
+            return self._wakati_batch(texts, lower, batch_size)
+
+        long_indice = set(long_indice)
+        short_indice = [i for i in range(len(texts)) if i not in long_indice]
+        words_list = [None] * len(texts)
+        for i, words in zip(short_indice, self._wakati_batch([texts[i] for i in short_indice],
+                                                             lower, batch_size)):
+            words_list[i] = words
+        for i in long_indice:
+            words_list[i] = self._wakati_long(texts[i], lower, batch_size)
+        return words_list
+
+
+    def _wakati_batch(self, texts, lower=False, batch_size=32, force=True):
+        # The texts have been preprocessed. If force is False,
+        # the words of the single_word_list are not forced.
+        kind = 'wakati' if force else 'wakati_unforced'
+        words_list = self._cache_get_many([(kind, text, lower) for text in texts])
+        missing = [i for i, words in enumerate(words_list) if words is None]
+        lower_texts = [texts[i].lower() for i in missing]
+        stats = self._stats
+
+        for indice in _buckets([len(text) for text in lower_texts], batch_size,
+                               self._model.batch_by_exact_length):
+            t = timer()
+            num_chars = sum(len(lower_texts[i]) for i in indice)
+            if len(lower_texts[indice[0]]) == 0:
+                tags_list = [[] for i in indice]
+            else:
+                feats = [self._feature_extraction(lower_texts[i]) for i in indice]
+                t = stats.lap('feature_extraction', t, num_chars)
+                obs_list = self._model.ws_observations_batch(feats)
+                t = stats.lap('encode_ws', t, num_chars)
+                stats.count('ws_graphs')
+                tags_list = utils.viterbi_batch(self._model.trans_array, obs_list)
+                t = stats.lap('viterbi', t, num_chars)
+
+            results = []
+            for i, tags in zip(indice, tags_list):
+                text = texts[missing[i]]
+                words = self._segment(text, lower_texts[i], tags, lower, force)
+                results.append(((kind, text, lower), words))
+                words_list[missing[i]] = words
+            stats.lap('segment', t, num_chars, sum(len(words) for _, words in results))
+            self._cache_put_many(results)
+        return words_list
+
+
+    def _is_long(self, length):
+        return self.max_length is not None and length > self.max_length
+
+
+    def _wakati_long(self, text, lower=False, batch_size=32):
+        # The chunks of a preprocessed text are segmented as minibatches,
+        # and the overlapping windows are joined at a common word boundary.
+        # The words of the single_word_list are found in the whole text and
+        # forced after the chunks are joined, so a chunk does not split them.
+        forced = None
+        if self.pattern or self._single_word_index:
+            forced = self._single_word_spans(text)
+        groups = _split_text(text, self.max_length, self.chunk_overlap)
+        spans = [span for group in groups for span in group]
+        words_list = self._wakati_batch([text[s:e] for s, e in spans], False, batch_size,
+                                        force=forced is None)
+
+        words = []
+        i = 0
+        for group in groups:
+            words.extend(_stitch(group, words_list[i:i+len(group)]))
+            i += len(group)
+        if forced:
+            words = _force_spans(text, words, forced)
+        if lower is True:
+            words = [w.lower() for w in words]
+        return words
+
 
+    def _feature_extraction(self, lower_text):
+        return utils.feature_extraction(text=lower_text,
+                                        uni2id=self._uni2id,
+                                        bi2id=self._bi2id,
+                                        dictionary=self._word2id,
+                                        window_size=self._hp['WINDOW_SIZE'],
+                                        word_index=self._word_index,
+                                        char_table=self._char_table)
+
+
+    def _segment(self, text, lower_text, tags, lower=False, force=True):
         # A word can be recognized as a single word forcibly.
-        if self.pattern:
-            for match in self.pattern.finditer(text):
-                span = match.span()
-                span_s = span[0]
-                span_e = span[1]
+        if force and (self.pattern or self._single_word_index):
+            for span_s, span_e in self._single_word_spans(text):
 
                 if (span_e - span_s) == 1:
                     tags[span_s:span_e] = [3]
@@ -110,12 +383,228 @@ class Tagger(object):
         return words
 
 
+    def _single_word_spans(self, text):
+        # The words of the single_word_list found from left to right.
+        # At the same start, the longer word is taken.
+        if self.pattern is None:
+            return self._single_word_index.longest_matches(text)
+        if self._single_word_index is None:
+            return [match.span() for match in self.pattern.finditer(text)
+                    if match.end() > match.start()]
+
+        # The next match of each source is kept until pos passes its start.
+        spans = []
+        pos = 0
+        literal = regex = None
+        literal_done = regex_done = False
+        while pos < len(text):
+            if not literal_done and (literal is None or literal[0] < pos):
+                literal = self._single_word_index.next_match(text, pos)
+                literal_done = literal is None
+            if not regex_done and (regex is None or regex[0] < pos):
+                regex = self._next_regex_match(text, pos)
+                regex_done = regex is None
+            if literal is None and regex is None:
+                break
+            if regex is None or (literal is not None and
+                                 (literal[0], -literal[1]) < (regex[0], -regex[1])):
+                span = literal
+            else:
+                span = regex
+            spans.append(span)
+            pos = span[1]
+        return spans
+
+
+    def _next_regex_match(self, text, pos):
+        # The empty matches are skipped.
+        while pos <= len(text):
+            match = self.pattern.search(text, pos)
+            if match is None:
+                return None
+            if match.end() > match.start():
+                return match.span()
+            pos = match.start() + 1
+        return None
+
+
     def _postagging(self, words, lower=False):
+        if self._is_long(sum(len(w) for w in words)):
+            return self._postagging_batch([words], lower)[0]
+
+        key = ('postagging', tuple(words), lower)
+        postags = self._cache_get_many([key])[0]
+        if postags is not None:
+            return postags
+
+        stats = self._stats
+        t = timer()
+        X = self._postagging_inputs(words, lower)
+        t = stats.lap('postagging_inputs', t, 0, len(words))
+        postags = [self._id2pos[pid] for pid in self._model.POStagging(X)]
+        stats.lap('encode_pt', t, 0, len(words))
+        stats.count('pt_graphs')
+        self._cache_put_many([(key, postags)])
+        return postags
+
+
+    def _postagging_batch(self, words_list, lower=False, batch_size=32):
+        if self.max_length is None:
+            return self._postagging_pieces(words_list, lower, batch_size)
+
+        # The long inputs are split into pieces at sentence punctuation,
+        # which are tagged in the same minibatches as the other inputs.
+        pieces_list = [_split_words(words, self.max_length) for words in words_list]
+        postags = self._postagging_pieces([piece for pieces in pieces_list for piece in pieces],
+                                          lower, batch_size)
+        postags_list = []
+        i = 0
+        for pieces in pieces_list:
+            postags_list.append([p for piece_postags in postags[i:i+len(pieces)]
+                                 for p in piece_postags])
+            i += len(pieces)
+        return postags_list
+
+
+    def _postagging_pieces(self, words_list, lower=False, batch_size=32):
+        postags_list = self._cache_get_many([('postagging', tuple(words), lower)
+                                             for words in words_list])
+        missing = [i for i, postags in enumerate(postags_list) if postags is None]
+        stats = self._stats
+
+        for indice in _buckets([len(words_list[i]) for i in missing], batch_size,
+                               self._model.batch_by_exact_length):
+            indice = [missing[i] for i in indice]
+            if len(words_list[indice[0]]) == 0:
+                pids_list = [[] for i in indice]
+            else:
+                t = timer()
+                num_words = sum(len(words_list[i]) for i in indice)
+                Xs = [self._postagging_inputs(words_list[i], lower) for i in indice]
+                t = stats.lap('postagging_inputs', t, 0, num_words)
+                pids_list = self._model.POStagging_batch(Xs)
+                stats.lap('encode_pt', t, 0, num_words)
+                stats.count('pt_graphs')
+
+            results = []
+            for i, pids in zip(indice, pids_list):
+                postags = [self._id2pos[pid] for pid in pids]
+                results.append((('postagging', tuple(words_list[i]), lower), postags))
+                postags_list[i] = postags
+            self._cache_put_many(results)
+        return postags_list
+
+
+    def _cache_get_many(self, keys):
+        values = [None] * len(keys)
+        if self._cache is not None:
+            values = [self._cache.get(key) for key in keys]
+
+        if self._persistent_cache is not None:
+            missing = [i for i, value in enumerate(values) if value is None]
+            if missing:
+                found = self._persistent_cache.get_many([keys[i] for i in missing])
+                for i, value in zip(missing, found):
+                    if value is not None:
+                        values[i] = tuple(value)
+                        if self._cache is not None:
+                            self._cache.put(keys[i], values[i])
+
+        if self.stats is not None and (self._cache is not None or
+                                       self._persistent_cache is not None):
+            hits = sum(1 for value in values if value is not None)
+            self.stats.count('cache_hits', hits)
+            self.stats.count('cache_misses', len(values) - hits)
+
+        # Return copies so that the cached values are not modified by a caller.
+        return [None if value is None else list(value) for value in values]
+
+
+    def _cache_put_many(self, items):
+        if self._cache is not None:
+            for key, value in items:
+                self._cache.put(key, tuple(value))
+        if self._persistent_cache is not None and items:
+            self._persistent_cache.put_many(items)
+
+
+    def warm_cache(self, texts, lower=False, chunk_size=256, batch_size=32):
+        """ Tag the sentences in bulk and store the results in the cache.
+
+        args:
+            - texts (iterable): Input sentences.
+            - lower (bool): If lower is True, all uppercase characters in a list \
+                            of the words are converted into lowercase characters.
+            - chunk_size (int): The number of sentences read at a time.
+            - batch_size (int): The maximum number of sentences in a minibatch.
+        """
+        if self._cache is None and self._persistent_cache is None:
+            raise ValueError("The cache is disabled. Set cache_size or cache_path.")
+        for _ in self.tag_stream(texts, lower, chunk_size=chunk_size,
+                                 batch_size=batch_size):
+            pass
+        if self._persistent_cache is not None:
+            self._persistent_cache.flush()
+            self._persistent_cache.evict()
+
+
+    def cache_info(self):
+        """ Return the statistics of the result cache.
+
+        return:
+            - dict : The numbers of hits, misses and evictions, the hit rate, \
+                     and the current and maximum sizes. The statistics of \
+                     the persistent cache are stored in 'persistent'. \
+                     None if the cache is disabled.
+        """
+        if self._cache is None and self._persistent_cache is None:
+            return None
+        info = {}
+        if self._cache is not None:
+            info = self._cache.info()
+        if self._persistent_cache is not None:
+            info['persistent'] = self._persistent_cache.info()
+        return info
+
+
+    def enable_stats(self, stats=None):
+        """ Record the wall time of each stage, the numbers of the characters \
+        and the words processed, and the cache hits (see nagisa.stats.TaggerStats).
+
+        args:
+            - stats (TaggerStats, optional): The stats to record. \
+                                             A TaggerStats can be shared by taggers.
+        return:
+            - TaggerStats : The stats, which can be exported by to_dict() \
+                            or to_prometheus().
+        """
+        if stats is None:
+            stats = TaggerStats()
+        self.stats = self._stats = stats
+        return stats
+
+
+    def disable_stats(self):
+        """ Stop recording the stats. Return the stats recorded so far. """
+        stats, self.stats = self.stats, None
+        self._stats = _NULL_STATS
+        return stats
+
+
+    def cache_clear(self):
+        """ Remove all cached results and reset the statistics. """
+        if self._cache is not None:
+            self._cache.clear()
+        if self._persistent_cache is not None:
+            self._persistent_cache.clear()
+
+
+    def _postagging_inputs(self, words, lower=False):
         if lower is True:
             words = [w.lower() for w in words]
 
         wids = utils.conv_tokens_to_ids(words, self._word2id)
-        cids = [utils.conv_tokens_to_ids([c for c in w], self._uni2id) for w in words]
+        cids = [self._char_table.unigram_ids(w) for w in words]
 
         # Improve the bottleneck in part-of-speech tagging.
         # No changes made to output results by this change.
@@ -129,8 +618,7 @@ class Tagger(object):
             tids.append(list(w2p))
 
         X = [cids, wids, tids]
-        postags = [self._id2pos[pid] for pid in self._model.POStagging(X)]
-        return postags
+        return X
 
 
     def postagging(self, words, lower=False):
@@ -158,8 +646,20 @@ class Tagger(object):
         """
         if not type(words) == list:
             raise AssertionError("Please input a list of words.")
-        words = [utils.preprocess_without_rstrip(w) if w == " " or w == "　"
-                 else utils.preprocess(w) for w in words]
+        memo = self._word_memo
+        if len(memo) > _WORD_MEMO_SIZE:
+            memo.clear()
+        preprocessed = []
+        for w in words:
+            p = memo.get(w)
+            if p is None:
+                if w == " " or w == "　":
+                    p = utils.preprocess_without_rstrip(w, self.prenormalized)
+                else:
+                    p = utils.preprocess(w, self.prenormalized)
+                memo[w] = p
+            preprocessed.append(p)
+        words = preprocessed
         postags = self._postagging(words, lower)
         return postags
 
@@ -177,6 +677,147 @@ class Tagger(object):
         return self._Token(text, lower, self.wakati, self._postagging)
 
 
+    def tagging_batch(self, texts, lower=False, batch_size=32):
+        """ Return the words with POS-tags of the given sentences in the input order.
+
+        The result is the same as calling tagging() for each sentence,
+        but the sentences are encoded as minibatches of the same length.
+
+        args:
+            - texts (list): Input sentences (a list or an iterable of str).
+            - lower (bool): If lower is True, all uppercase characters in a list \
+                            of the words are converted into lowercase characters.
+            - batch_size (int): The maximum number of sentences in a minibatch.
+        return:
+            - list : A list of the objects of the words with POS-tags.
+        """
+        texts = list(texts)
+        words_list = self.wakati_batch(texts, lower, batch_size)
+        postags_list = self._postagging_batch(words_list, lower, batch_size)
+        return [self._Token(text, lower, self.wakati, self._postagging,
+                            _words=words, _postags=postags)
+                for text, words, postags in zip(texts, words_list, postags_list)]
+
+
+    def tagging_spans(self, text, lower=False):
+        """ Return the words with POS-tag ids of the given sentence as offsets.
+
+        args:
+            - text (str): An input sentence.
+            - lower (bool): If lower is True, the words are segmented as the \
+                            words of tagging(text, lower=True).
+        return:
+            - Spans : The (start, end) offsets of the words in the text \
+                      and the POS-tag ids (see nagisa.spans.Spans).
+        """
+        return self.tagging_spans_batch([text], lower)[0]
+
+
+    def tagging_spans_batch(self, texts, lower=False, batch_size=32):
+        """ Return the words with POS-tag ids of the given sentences as offsets.
+
+        The segmentation and the POS-tags are the same as those of
+        tagging_batch(), but the words are the surfaces of the original texts
+        (e.g., ' ' rather than '　', 'ｶﾞ' rather than 'ガ' and not lowercased)
+        rather than the normalized words. The results are returned as arrays,
+        so no string is made for each word until it is used.
+
+        args:
+            - texts (list): Input sentences (a list or an iterable of str).
+            - lower (bool): See tagging_spans().
+            - batch_size (int): The maximum number of sentences in a minibatch.
+        return:
+            - list : A list of Spans.
+        """
+        texts = list(texts)
+        preprocessed = self._preprocess_batch(texts)
+        words_list = self._wakati_preprocessed(preprocessed, lower, batch_size)
+        postags_list = self._postagging_batch(words_list, lower, batch_size)
+        pos2id = self._pos2id
+        return [nagisa_spans.from_words(text, pre, words, [pos2id[p] for p in postags],
+                                        self._postag_names, lower, self.prenormalized)
+                for text, pre, words, postags in zip(texts, preprocessed, words_list,
+                                                     postags_list)]
+
+
+    def tagging_many(self, texts, lower=False, n_jobs=None, chunk_size=256,
+                     max_pending=None, batch_size=32):
+        """ Return a generator of the words with POS-tags of the given sentences.
+
+        The sentences are read lazily in chunks and tagged by n_jobs worker
+        processes. The results are yielded in the input order.
+
+        args:
+            - texts (iterable): Input sentences.
+            - lower (bool): If lower is True, all uppercase characters in a list \
+                            of the words are converted into lowercase characters.
+            - n_jobs (int): The number of worker processes. \
+                            The default is the number of CPUs.
+            - chunk_size (int): The number of sentences sent to a worker at a time.
+            - max_pending (int): The maximum number of chunks being processed. \
+                                 The default is 2*n_jobs.
+            - batch_size (int): The maximum number of sentences in a minibatch.
+        return:
+            - generator : The objects of the words with POS-tags.
+        """
+        return parallel.tagging_many(self, texts, lower, n_jobs=n_jobs,
+                                     chunk_size=chunk_size, max_pending=max_pending,
+                                     batch_size=batch_size)
+
+
+    def tag_stream(self, texts, lower=False, n_jobs=1, chunk_size=256,
+                   max_pending=None, batch_size=32):
+        """ Return a generator of the words with POS-tags of the given sentences.
+
+        The input is read lazily in chunks of chunk_size sentences,
+        so the memory usage does not depend on the number of sentences.
+
+        args:
+            - texts (iterable): Input sentences.
+            - lower (bool): If lower is True, all uppercase characters in a list \
+                            of the words are converted into lowercase characters.
+            - n_jobs (int): The number of worker processes.
+            - chunk_size (int): The number of sentences read at a time.
+            - max_pending (int): The maximum number of chunks being processed \
+                                 when n_jobs > 1.
+            - batch_size (int): The maximum number of sentences in a minibatch.
+        return:
+            - generator : The objects of the words with POS-tags.
+        """
+        return parallel.tagging_many(self, texts, lower, n_jobs=n_jobs,
+                                     chunk_size=chunk_size, max_pending=max_pending,
+                                     batch_size=batch_size)
+
+
+    def tag_file(self, filename, encoding='utf_8_sig', lower=False, n_jobs=1,
+                 chunk_size=256, max_pending=None, batch_size=32):
+        """ Return a generator of the words with POS-tags of each line in the file.
+
+        The file is read line by line, and one object is yielded for each line
+        (including an empty line), so the output is aligned with the input lines.
+
+        args:
+            - filename (str): Path to an input file.
+            - encoding (str): The encoding of the file.
+            - lower (bool): If lower is True, all uppercase characters in a list \
+                            of the words are converted into lowercase characters.
+            - n_jobs (int): The number of worker processes.
+            - chunk_size (int): The number of lines read at a time.
+            - max_pending (int): The maximum number of chunks being processed \
+                                 when n_jobs > 1.
+            - batch_size (int): The maximum number of sentences in a minibatch.
+        return:
+            - generator : The objects of the words with POS-tags.
+        """
+        with io.open(filename, 'r', encoding=encoding) as f:
+            lines = (line.rstrip('\r\n') for line in f)
+            for token in self.tag_stream(lines, lower, n_jobs=n_jobs,
+                                         chunk_size=chunk_size,
+                                         max_pending=max_pending,
+                                         batch_size=batch_size):
+                yield token
+
+
     def filter(self, text, lower=False, filter_postags=None):
         """Return the filtered words with POS-tags of the given sentence.
 
@@ -232,26 +873,149 @@ class Tagger(object):
                            _words=words, _postags=postags)
 
 
-    class _Token(object):
-        def __init__(self, text, lower, wakati, postagging, _words=None, _postags=None):
-            self.text = text
-            self.__lower = lower
-            self.__words = _words
-            self.__postags = _postags
-            self.__wakati = wakati
-            self.__postagging = postagging
-
-        @property
-        def words(self):
-            if self.__words is None:
-                self.__words = self.__wakati(self.text, self.__lower)
-            return self.__words
-
-        @property
-        def postags(self):
-            if self.__postags is None:
-                self.__postags = self.__postagging(self.words, self.__lower)
-            return self.__postags
-
-        def __str__(self):
-            return ' '.join([w+'/'+p for w, p in zip(self.words, self.postags)])
+    # The class of the results is kept as Tagger._Token.
+    _Token = Token
+
+
+# The options of a Tagger which change the results, except the model files
+# and the single_word_list. They are a part of the key of the persistent cache.
+_RESULT_OPTIONS = ['engine', 'max_length', 'chunk_overlap', 'max_word_length',
+                   'prenormalized']
+
+# The stats of the taggers whose stats are disabled.
+_NULL_STATS = NullStats()
+
+# The maximum number of the words memoized by decode().
+_WORD_MEMO_SIZE = 100000
+
+# A word of the single_word_list is a regular expression if it has these characters.
+# (The parentheses are escaped.)
+_REGEX_META = re.compile(r'[.^$*+?{}\[\]\\|]')
+
+# A sentence ends at these characters (after the preprocessing).
+_SENTENCE_END = re.compile(u'[。!?\n]+')
+
+
+def _split_text(text, max_length, overlap):
+    """Split a text into chunks of at most max_length characters.
+    Return a list of groups of (start, end) spans. A group is a chunk of
+    whole sentences, or the overlapping windows of a sentence longer than
+    max_length, which are joined by _stitch().
+    """
+    ends = [m.end() for m in _SENTENCE_END.finditer(text)]
+    if not ends or ends[-1] != len(text):
+        ends.append(len(text))
+
+    groups = []
+    chunk_start = 0
+    prev_end = 0
+    for end in ends:
+        if end - chunk_start > max_length and prev_end > chunk_start:
+            groups.append([(chunk_start, prev_end)])
+            chunk_start = prev_end
+        if end - chunk_start > max_length:
+            windows = []
+            start = chunk_start
+            while True:
+                windows.append((start, min(start+max_length, end)))
+                if start+max_length >= end:
+                    break
+                start += max_length - overlap
+            groups.append(windows)
+            chunk_start = end
+        prev_end = end
+    if chunk_start < len(text):
+        groups.append([(chunk_start, len(text))])
+    return groups
+
+
+def _stitch(spans, words_list):
+    """Join the words of overlapping windows. Each overlap is cut at a word boundary
+    of both windows nearest to its middle (or of the first window if there is none),
+    and a word is taken from the window which contains it before the cut.
+    """
+    boundaries = []
+    for (start, _), words in zip(spans, words_list):
+        offsets = [start]
+        for w in words:
+            offsets.append(offsets[-1]+len(w))
+        boundaries.append(offsets)
+
+    cuts = [spans[0][0]]
+    for i in range(1, len(spans)):
+        lo, hi = spans[i][0], spans[i-1][1]
+        prev = set(boundaries[i-1])
+        candidates = ([b for b in boundaries[i] if lo < b < hi and b in prev]
+                      or [b for b in boundaries[i-1] if lo < b < hi]
+                      or [(lo+hi) // 2])
+        cuts.append(min(candidates, key=lambda b: abs(2*b-lo-hi)))
+    cuts.append(spans[-1][1])
+
+    stitched = []
+    for i, words in enumerate(words_list):
+        for w, s in zip(words, boundaries[i]):
+            w = w[max(cuts[i]-s, 0):max(cuts[i+1]-s, 0)]
+            if w:
+                stitched.append(w)
+    return stitched
+
+
+def _force_spans(text, words, spans):
+    """Segment a text so that each (start, end) span is a word.
+    The other word boundaries are those of the words.
+    """
+    boundaries = set()
+    offset = 0
+    for w in words:
+        offset += len(w)
+        boundaries.add(offset)
+    for start, end in spans:
+        boundaries.difference_update(range(start+1, end))
+        boundaries.update([start, end])
+    boundaries.discard(0)
+    cuts = [0] + sorted(boundaries)
+    return [text[s:e] for s, e in zip(cuts, cuts[1:])]
+
+
+def _split_words(words, max_length):
+    """Split a list of words into pieces of at most max_length characters,
+    after the sentence punctuation if possible.
+    """
+    pieces = []
+    piece = []
+    length = 0
+    sentence_end = -1
+    for w in words:
+        piece.append(w)
+        length += len(w)
+        if length > max_length and len(piece) > 1:
+            cut = sentence_end+1 if sentence_end >= 0 else len(piece)-1
+            pieces.append(piece[:cut])
+            piece = piece[cut:]
+            length = sum(len(w) for w in piece)
+            sentence_end = -1
+        if _SENTENCE_END.search(w):
+            sentence_end = len(piece)-1
+    if piece or not pieces:
+        pieces.append(piece)
+    return pieces
+
+
+def _buckets(lengths, batch_size, exact=True):
+    """Group the indice of the inputs into buckets of the same length,
+    or of similar lengths if exact is False. Each bucket has at most
+    batch_size indice, and the empty inputs are never mixed with the others.
+    """
+    indice_by_length = {}
+    for i, length in enumerate(lengths):
+        if exact or length == 0:
+            indice_by_length.setdefault(length, []).append(i)
+        else:
+            indice_by_length.setdefault(-1, []).append(i)
+
+    for length in sorted(indice_by_length):
+        indice = indice_by_length[length]
+        if length == -1:
+            indice = sorted(indice, key=lambda i: lengths[i])
+        for s in range(0, len(indice), batch_size):
+            yield indice[s:s+batch_size]
@@ -0,0 +1,45 @@
+# -*- coding:utf-8 -*-
+"""
+The words with POS-tags of a sentence. This module does not import NumPy,
+so that nagisa.client returns the results without loading the tagger.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+
+class Token(object):
+    """
+    The words with POS-tags of a sentence (see Tagger.tagging).
+    The words and the POS-tags are computed when they are used first.
+
+    args:
+        - text (str): The input sentence.
+        - lower (bool): If lower is True, the words are lowercased.
+        - wakati (function): A function which returns the words of the text.
+        - postagging (function): A function which returns the POS-tags of the words.
+        - _words (list, optional): The words, if they have been computed.
+        - _postags (list, optional): The POS-tags, if they have been computed.
+    """
+
+    def __init__(self, text, lower, wakati, postagging, _words=None, _postags=None):
+        self.text = text
+        self.__lower = lower
+        self.__words = _words
+        self.__postags = _postags
+        self.__wakati = wakati
+        self.__postagging = postagging
+
+    @property
+    def words(self):
+        if self.__words is None:
+            self.__words = self.__wakati(self.text, self.__lower)
+        return self.__words
+
+    @property
+    def postags(self):
+        if self.__postags is None:
+            self.__postags = self.__postagging(self.words, self.__lower)
+        return self.__postags
+
+    def __str__(self):
+        return ' '.join([w+'/'+p for w, p in zip(self.words, self.postags)])
@@ -8,7 +8,6 @@ import logging
 from collections import OrderedDict
 
 
-import model
 import prepro
 import mecab_system_eval
 import nagisa_utils as utils
@@ -130,6 +129,8 @@ def fit(train_file, dev_file, test_file, model_name,
     hp['VOCAB_SIZE_POSTAG'] = len(vocabs[3])
 
     # Construct networks
+    # DyNet is imported only when a model is trained.
+    import model
     _model = model.Model(hp=hp, embs=embs)
 
     # Start training
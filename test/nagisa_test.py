@@ -1,6 +1,17 @@
 # -*- coding:utf-8 -*-
 
+import os
+import pickle
+import inspect
+import socket
+import shutil
+import sys
+import tempfile
+import unicodedata
 import unittest
+import subprocess
+
+import numpy as np
 
 import nagisa
 
@@ -122,6 +133,634 @@ class TestNagisa(unittest.TestCase):
         self.assertEqual(output, str(words))
 
 
+    def test_tagging_batch(self):
+        # test_27
+        texts = ['Pythonで簡単に使えるツールです', '', 'こんばんは😀',
+                 'ニューラルネットワークを使ってます。', 'ｺﾝﾊﾞﾝﾊ１２３４５',
+                 'Rubyで簡単に使えるツールです']
+        outputs = nagisa.tagging_batch(texts, batch_size=2)
+        self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                         [str(output) for output in outputs])
+
+        # test_28
+        outputs = nagisa.wakati_batch(iter(texts), lower=True)
+        self.assertEqual([nagisa.wakati(text, lower=True) for text in texts], outputs)
+
+        # test_29
+        tagger_nn = nagisa.Tagger(single_word_list=['ニューラルネットワーク'])
+        outputs = tagger_nn.tagging_batch(texts)
+        self.assertEqual([str(tagger_nn.tagging(text)) for text in texts],
+                         [str(output) for output in outputs])
+
+
+    def test_tagging_many(self):
+        # test_30
+        texts = ['Pythonで簡単に使えるツールです', '', 'こんばんは😀',
+                 '3月に見た「3月のライオン」'] * 3
+        outputs = nagisa.tagging_many(iter(texts), n_jobs=2, chunk_size=2, max_pending=2)
+        self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                         [str(output) for output in outputs])
+
+
+    def test_tag_stream(self):
+        # test_31
+        texts = ['Pythonで簡単に使えるツールです', '', 'こんばんは😀']
+        outputs = nagisa.tagger.tag_stream(iter(texts), chunk_size=2)
+        self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                         [str(output) for output in outputs])
+
+        # test_32
+        fd, filename = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write('\n'.join(texts).encode('utf-8'))
+        try:
+            outputs = nagisa.tagger.tag_file(filename, chunk_size=2)
+            self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                             [str(output) for output in outputs])
+        finally:
+            os.remove(filename)
+
+
+    def test_cache(self):
+        # test_34
+        text = 'Pythonで簡単に使えるツールです'
+        output = str(nagisa.tagging(text))
+        cached_tagger = nagisa.Tagger(cache_size=2)
+        self.assertEqual(output, str(cached_tagger.tagging(text)))
+        self.assertEqual(output, str(cached_tagger.tagging(text)))
+        info = cached_tagger.cache_info()
+        self.assertEqual(2, info['hits'])
+        self.assertEqual(2, info['misses'])
+
+        # test_35
+        cached_tagger.wakati('こんばんは')
+        self.assertEqual(1, cached_tagger.cache_info()['evictions'])
+        self.assertEqual(2, cached_tagger.cache_info()['size'])
+
+        # test_36
+        words = cached_tagger.wakati(text)
+        words.append('!')
+        self.assertEqual(nagisa.wakati(text), cached_tagger.wakati(text))
+        self.assertIsNone(nagisa.tagger.cache_info())
+
+
+    def test_persistent_cache(self):
+        # test_37
+        texts = ['Pythonで簡単に使えるツールです', 'こんばんは😀']
+        fd, cache_path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        try:
+            cached_tagger = nagisa.Tagger(cache_path=cache_path, cache_max_entries=10)
+            cached_tagger.warm_cache(texts)
+            self.assertEqual(4, cached_tagger.cache_info()['persistent']['size'])
+
+            # test_38
+            cached_tagger = nagisa.Tagger(cache_path=cache_path)
+            outputs = cached_tagger.tagging_batch(texts)
+            self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                             [str(output) for output in outputs])
+            self.assertEqual(4, cached_tagger.cache_info()['persistent']['hits'])
+
+            # test_39
+            cached_tagger = nagisa.Tagger(cache_path=cache_path,
+                                          single_word_list=['簡単に使える'])
+            cached_tagger.wakati(texts[0])
+            self.assertEqual(0, cached_tagger.cache_info()['persistent']['hits'])
+
+            # test_79
+            text = 'インターネットサービスプロバイダ'
+            nagisa.Tagger(engine='numpy', cache_path=cache_path).wakati(text)
+            cached_tagger = nagisa.Tagger(engine='numpy', max_word_length=1,
+                                          cache_path=cache_path)
+            self.assertEqual(nagisa.Tagger(engine='numpy', max_word_length=1).wakati(text),
+                             cached_tagger.wakati(text))
+            self.assertEqual(0, cached_tagger.cache_info()['persistent']['hits'])
+            cached_tagger = nagisa.Tagger(engine='numpy', prenormalized=True,
+                                          cache_path=cache_path)
+            cached_tagger.wakati(text)
+            self.assertEqual(0, cached_tagger.cache_info()['persistent']['hits'])
+        finally:
+            for suffix in ['', '-wal', '-shm']:
+                if os.path.exists(cache_path+suffix):
+                    os.remove(cache_path+suffix)
+
+
+    def test_numpy_engine(self):
+        # test_40
+        texts = ['Pythonで簡単に使えるツールです', '', 'こんばんは😀',
+                 'https://github.com/taishi-i/nagisaでコードを公開中(๑¯ω¯๑)',
+                 'ｺﾝﾊﾞﾝﾊ１２３４５', 'エラーを避けるため、İはIに変換される']
+        numpy_tagger = nagisa.Tagger(engine='numpy')
+        outputs = [str(nagisa.tagging(text)) for text in texts]
+        self.assertEqual(outputs, [str(numpy_tagger.tagging(text)) for text in texts])
+
+        # test_41
+        self.assertEqual(outputs, [str(output) for output in numpy_tagger.tagging_batch(texts)])
+
+        # test_42
+        words = [" (人•ᴗ•♡)", "　", "こんばんは", "♪"]
+        self.assertEqual(nagisa.decode(words), numpy_tagger.decode(words))
+
+        # test_43
+        with self.assertRaises(ValueError):
+            nagisa.Tagger(engine='unknown')
+
+        # test_62
+        # The padding of a minibatch does not change the observations of a sentence.
+        feats = [numpy_tagger._feature_extraction(text.lower()) for text in texts if text]
+        model = numpy_tagger._model
+        for X, obs in zip(feats, model.ws_observations_batch(feats)):
+            self.assertTrue(np.allclose(model.ws_observations(X), obs, atol=1e-5))
+
+
+    def test_lazy_import(self):
+        # test_44
+        code = ('import sys, nagisa; '
+                'print(nagisa._tagger is None, "dynet" in sys.modules)')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual('True False', output.decode('utf-8').strip())
+
+        # test_83
+        # The client does not import NumPy and the tagger.
+        code = ('import sys, nagisa.client; '
+                'print("numpy" in sys.modules, "nagisa.tagger" in sys.modules)')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual('False False', output.decode('utf-8').strip())
+
+        # test_85
+        # The training function and the submodules are imported when they are used.
+        code = ('import nagisa; nagisa.fit; '
+                'print(nagisa.train.__name__, nagisa.model.__name__)')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual('nagisa.train nagisa.model', output.decode('utf-8').strip())
+
+        # test_45
+        self.assertEqual(nagisa.Tagger.wakati.__doc__, nagisa.wakati.__doc__)
+        if hasattr(inspect, 'signature'):
+            self.assertEqual(['text', 'lower'], list(inspect.signature(nagisa.wakati).parameters))
+
+        # test_84
+        # The default tagger is built once by the threads using it first.
+        code = ('import threading, nagisa; n = []; init = nagisa.Tagger.__init__; '
+                'nagisa.Tagger.__init__ = lambda self, *a, **k: (n.append(1), init(self, *a, **k))[1]; '
+                'ts = [threading.Thread(target=nagisa._get_tagger) for _ in range(4)]; '
+                '[th.start() for th in ts]; [th.join() for th in ts]; print(len(n))')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual('1', output.decode('utf-8').strip())
+
+        # test_86
+        # nagisa.tagger is a Tagger, and it can be replaced.
+        code = ('import nagisa; print(isinstance(nagisa.tagger, nagisa.Tagger)); '
+                't = nagisa.Tagger(single_word_list=["簡単に使える"]); nagisa.tagger = t; '
+                'import nagisa.tagger; print(nagisa.tagger is t, '
+                '"簡単に使える" in nagisa.wakati("Pythonで簡単に使えるツールです"))')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(['True', 'True True'], output.decode('utf-8').strip().splitlines())
+        self.assertIn('名詞', nagisa.tagger.postags)
+
+
+    def test_shared_model(self):
+        # test_46
+        table = nagisa.utils.StringTable.from_dict({'名詞': [0, 2], 'a': [1], '': []})
+        self.assertEqual([0, 2], table['名詞'])
+        self.assertEqual([], table[''])
+        self.assertIsNone(table.get('b'))
+        self.assertEqual(3, len(table))
+
+        # test_47
+        text = 'Pythonで簡単に使えるツールです'
+        shared_dir = tempfile.mkdtemp()
+        try:
+            shared_tagger = nagisa.Tagger(engine='numpy', shared_dir=shared_dir)
+            self.assertEqual(str(nagisa.tagging(text)), str(shared_tagger.tagging(text)))
+            shared_tagger = nagisa.Tagger(engine='numpy', shared_dir=shared_dir)
+            self.assertEqual(str(nagisa.tagging(text)), str(shared_tagger.tagging(text)))
+
+            # test_48
+            unpickled_tagger = pickle.loads(pickle.dumps(shared_tagger))
+            self.assertEqual(str(nagisa.tagging(text)), str(unpickled_tagger.tagging(text)))
+        finally:
+            shutil.rmtree(shared_dir)
+
+
+    def test_viterbi(self):
+        # test_49
+        trans = np.array([[0., 1.], [2., 0.]])
+        observations = [np.array([[0., 1.]]), np.zeros((0, 2)),
+                         np.array([[0., 3.], [1., 0.], [0., 0.]])]
+        # With two tags, the tag 0 is the start and the tag 1 is the end.
+        self.assertEqual([1], nagisa.utils.np_viterbi(trans, observations[0]))
+        self.assertEqual([], nagisa.utils.np_viterbi(trans, observations[1]))
+
+        # test_50
+        self.assertEqual([nagisa.utils.np_viterbi(trans, obs) for obs in observations],
+                         nagisa.utils.viterbi_batch(trans, observations))
+
+
+    def test_long_text(self):
+        # test_51
+        text = 'Pythonで簡単に使えるツールです。東京都に住んでいます。' * 20
+        long_tagger = nagisa.Tagger(max_length=50, chunk_overlap=10)
+        self.assertEqual(nagisa.wakati(text), long_tagger.wakati(text))
+        self.assertEqual(str(nagisa.tagging(text)), str(long_tagger.tagging(text)))
+
+        # test_52
+        text = text.replace('。', '')
+        words = long_tagger.wakati(text)
+        self.assertEqual(text, ''.join(words))
+        self.assertEqual(len(words), len(long_tagger.tagging(text).postags))
+
+        # test_53
+        self.assertEqual(nagisa.wakati_batch(['', text]), long_tagger.wakati_batch(['', text]))
+        with self.assertRaises(ValueError):
+            nagisa.Tagger(max_length=50, chunk_overlap=30)
+
+        # test_80
+        # The words of the single_word_list across the chunk boundaries are not split.
+        text = 'Pythonで簡単に使えるツールです' * 3
+        single_word_list = ['簡単に使えるツール']
+        long_tagger = nagisa.Tagger(max_length=12, chunk_overlap=4,
+                                    single_word_list=single_word_list)
+        self.assertEqual(nagisa.Tagger(single_word_list=single_word_list).wakati(text),
+                         long_tagger.wakati(text))
+        long_tagger = nagisa.Tagger(max_length=12, chunk_overlap=4, single_word_list=[r'\d+'])
+        words = long_tagger.wakati('番号は12345678901234567890です')
+        self.assertIn('12345678901234567890', words)
+
+
+    def test_word_index(self):
+        # test_54
+        dictionary = {'oov': 0, 'pad': 1, '東京': 2, '東京都': 3, '京都': 4, '都': 5}
+        text = '東京都と京都'
+        word_index = nagisa.utils.WordIndex(dictionary)
+        self.assertEqual((nagisa.utils.get_words_starting_at_i(text, dictionary),
+                          nagisa.utils.get_words_ending_at_i(text, dictionary)),
+                         word_index.lookup(text))
+
+        # test_55
+        word_index = nagisa.utils.WordIndex(dictionary, max_length=2)
+        self.assertEqual([[2], [4], [5], [0], [4], [5]], word_index.lookup(text)[0])
+        self.assertEqual([[0], [2], [5, 4], [0], [0], [5, 4]], word_index.lookup(text)[1])
+
+
+    def test_char_table(self):
+        # test_56
+        uni2id = {'oov': 0, 'pad': 1, 'a': 2, 'あ': 3, '😀': 4}
+        bi2id = {'oov': 0, 'pad': 1, 'aあ': 2, 'あ<E>': 3, '😀a': 4}
+        text = 'aあ😀aあ漢'
+        char_table = nagisa.utils.CharTable(uni2id, bi2id)
+        self.assertEqual(nagisa.utils.conv_tokens_to_ids(nagisa.utils.get_unigram(text), uni2id),
+                         char_table.unigram_ids(text))
+        self.assertEqual(nagisa.utils.conv_tokens_to_ids(nagisa.utils.get_bigram(text), bi2id),
+                         char_table.bigram_ids(text))
+
+        # test_57
+        text = 'ｱ①Ａ漢あア!　'
+        self.assertEqual([nagisa.utils.get_chartype(c) for c in text],
+                         char_table.chartypes(text))
+
+
+    def test_preprocess(self):
+        # test_58
+        for text in ['Python is easy ', 'ＰｙｔｈｏｎİＡ ', 'ｺﾝﾊﾞﾝﾊ①', 'こんばんは　']:
+            expected = unicodedata.normalize('NFKC', text.rstrip())
+            expected = expected.replace('İ', 'I').replace(' ', '　')
+            self.assertEqual(expected, nagisa.utils.preprocess(text))
+            self.assertEqual(expected, nagisa.utils.preprocess(expected, prenormalized=True))
+
+        # test_59
+        text = 'Pythonで簡単に使えるツールです'
+        prenormalized_tagger = nagisa.Tagger(prenormalized=True)
+        self.assertEqual(str(nagisa.tagging(text)), str(prenormalized_tagger.tagging(text)))
+        # The words memoized by decode() have the same POS-tags as
+        # those of a new tagger, whose memo is empty.
+        words = [" (人•ᴗ•♡)", "　", " ", "ｺﾝﾊﾞﾝﾊ", "ｺﾝﾊﾞﾝﾊ"]
+        memo_tagger = nagisa.Tagger()
+        postags = nagisa.Tagger().decode(words)
+        self.assertEqual(postags, memo_tagger.decode(words))
+        self.assertTrue(memo_tagger._word_memo)
+        self.assertEqual(postags, memo_tagger.decode(words))
+
+
+    def test_single_word_index(self):
+        # test_60
+        text = '3月に見た「3月のライオン」と12月(土)'
+        single_word_list = ['3月のライオン', 'ライオン', '3月の', '(土)']
+        new_tagger = nagisa.Tagger(single_word_list=single_word_list)
+        self.assertIsNone(new_tagger.pattern)
+        words = new_tagger.wakati(text)
+        self.assertIn('3月のライオン', words)
+        self.assertIn('(土)', words)
+
+        # test_61
+        shared_dir = tempfile.mkdtemp()
+        try:
+            single_word_list += ['[0-9]+月']
+            for _ in range(2):
+                new_tagger = nagisa.Tagger(single_word_list=single_word_list,
+                                           shared_dir=shared_dir)
+                self.assertEqual(['3月', '3月のライオン', '12月', '(土)'],
+                                 [text[s:e] for s, e in new_tagger._single_word_spans(text)])
+        finally:
+            shutil.rmtree(shared_dir)
+
+
+    def test_quantize(self):
+        # test_63
+        import nagisa.np_model as np_model
+        import nagisa.quantize as quantize
+        array = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]], dtype=np.float32)
+        q, scale = np_model.quantize_array(array)
+        self.assertEqual(q.dtype, np.int8)
+        self.assertEqual([127, 0], np.abs(q).max(axis=1).tolist())
+        self.assertTrue(np.allclose(array, q * scale[:, None], atol=1./254))
+
+        # test_64
+        base = os.path.dirname(os.path.abspath(nagisa.__file__))
+        vocabs = base + '/data/nagisa_v001.dict'
+        params = base + '/data/nagisa_v001.model'
+        hp = base + '/data/nagisa_v001.hp'
+        test_file = base + '/data/sample_datasets/sample.test'
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            quantized = quantize.quantize(params, hp, os.path.join(tmp_dir, 'nagisa.qparams'))
+            self.assertTrue(np_model.is_quantized(quantized))
+            self.assertFalse(np_model.is_quantized(params))
+            with self.assertRaises(ValueError):
+                nagisa.Tagger(vocabs=vocabs, params=quantized, hp=hp)
+
+            int8_tagger = nagisa.Tagger(vocabs=vocabs, params=quantized, hp=hp, engine='numpy')
+            text = 'Pythonで簡単に使えるツールです'
+            self.assertEqual(nagisa.wakati(text), int8_tagger.wakati(text))
+
+            # test_81
+            # The int8 tables are shared as they are, not as float32 arrays.
+            shared_tagger = nagisa.Tagger(vocabs=vocabs, params=quantized, hp=hp, engine='numpy',
+                                          shared_dir=os.path.join(tmp_dir, 'shared'))
+            self.assertIsInstance(shared_tagger._model.UNI, np_model.QuantizedTable)
+            self.assertEqual(np.int8, shared_tagger._model.UNI.q.dtype)
+            self.assertEqual(int8_tagger.wakati(text), shared_tagger.wakati(text))
+
+            report = quantize.compare(vocabs, params, hp, quantized, test_file)
+            self.assertEqual(report['float']['ws_f1'], 100.0)
+            self.assertGreaterEqual(report['int8']['ws_f1'], 95.0)
+            self.assertLess(report['delta']['model_bytes_ratio'], 0.5)
+            self.assertLess(report['int8']['file_bytes'], report['float']['file_bytes'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+    def test_bundle(self):
+        # test_65
+        import nagisa.bundle as bundle
+        texts = ['Pythonで簡単に使えるツールです', '', 'こんばんは😀',
+                 'https://github.com/taishi-i/nagisaでコードを公開中(๑¯ω¯๑)']
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            fn = os.path.join(tmp_dir, 'nagisa_v001.nagisa')
+            bundle.main(['--output', fn])
+            self.assertTrue(bundle.is_bundle(fn))
+            numpy_tagger = nagisa.Tagger(engine='numpy')
+            bundle_tagger = nagisa.Tagger(bundle=fn, engine='numpy')
+            self.assertEqual([str(numpy_tagger.tagging(text)) for text in texts],
+                             [str(output) for output in bundle_tagger.tagging_batch(texts)])
+            self.assertEqual(numpy_tagger.postags, bundle_tagger.postags)
+            self.assertEqual(numpy_tagger.id2pos, bundle_tagger.id2pos)
+            self.assertFalse(bundle_tagger._model.arrays['BI'].flags.writeable)
+
+            new_tagger = pickle.loads(pickle.dumps(bundle_tagger))
+            self.assertEqual(bundle_tagger.wakati(texts[0]), new_tagger.wakati(texts[0]))
+
+            # test_66
+            hp, arrays = bundle.read(fn)
+            self.assertEqual(hp['WINDOW_SIZE'], 3)
+            for array in arrays.values():
+                self.assertEqual(array.ctypes.data % 64, 0)
+            char_table = nagisa.utils.CharTable(arrays=bundle.load(fn).char_table)
+            self.assertEqual(numpy_tagger._char_table.bigram_ids(texts[2]),
+                             char_table.bigram_ids(texts[2]))
+            with self.assertRaises(ValueError):
+                bundle.read(numpy_tagger._init_args['hp'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+    def test_registry(self):
+        # test_67
+        import gc
+        import nagisa.registry as registry
+        text = 'Pythonで簡単に使えるツールです'
+        tagger_a = nagisa.Tagger(engine='numpy')
+        tagger_b = nagisa.Tagger(engine='numpy', single_word_list=['簡単に使える'])
+        self.assertIs(tagger_a._model, tagger_b._model)
+        self.assertIs(tagger_a._word2postags, tagger_b._word2postags)
+        self.assertNotIn('簡単に使える', tagger_a.wakati(text))
+        self.assertIn('簡単に使える', tagger_b.wakati(text))
+        self.assertIsNot(tagger_a._model, nagisa.Tagger(engine='numpy', max_word_length=4)._model)
+
+        # test_68
+        key = registry.model_key(*[tagger_a._init_args[k] for k in ['vocabs', 'params', 'hp']],
+                                 engine='numpy')
+        self.assertIn(key, registry.loaded_models())
+        del tagger_a, tagger_b
+        gc.collect()
+        self.assertNotIn(key, registry.loaded_models())
+
+
+    def test_spans(self):
+        # test_69
+        texts = ['Pythonで簡単に使えるツールです', '', 'ｺﾝﾊﾞﾝﾊ１２３４５', '㍻の時代 ',
+                 'エラーを避けるため、İはIに変換される']
+        outputs = nagisa.tagging_batch(texts)
+        spans_list = nagisa.tagging_spans_batch(texts)
+        for text, output, spans in zip(texts, outputs, spans_list):
+            self.assertEqual(output.postags, spans.postags)
+            self.assertEqual(output.words, [nagisa.utils.preprocess(w) for w in spans.words])
+            self.assertEqual(spans.words, [text[s:e] for s, e in zip(spans.starts, spans.ends)])
+        self.assertEqual([[0, 6], [6, 7], [7, 8]], spans_list[2].offsets[:3].tolist())
+        self.assertEqual(['㍻', 'の', '時代'], spans_list[3].words)
+        self.assertEqual(spans_list[0].pos_ids.dtype, np.int32)
+
+        # test_70
+        spans = nagisa.tagging_spans(texts[0])
+        self.assertEqual(str(nagisa.extract(texts[0], extract_postags=['名詞'])),
+                         str(spans.extract(['名詞'])))
+        self.assertEqual(str(nagisa.filter(texts[0], filter_postags=['助詞', '助動詞'])),
+                         str(spans.filter(['助詞', '助動詞'])))
+        self.assertEqual([True, False, False, False, False, True, False],
+                         spans.mask(['名詞']).tolist())
+        with self.assertRaises(AttributeError):
+            spans.other = None
+
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'asyncio.run requires Python 3.7')
+    def test_async_tagger(self):
+        # test_71
+        import asyncio
+        from nagisa.async_tagger import AsyncTagger
+        texts = ['Pythonで簡単に使えるツールです', '', 'こんばんは😀', 'ｺﾝﾊﾞﾝﾊ１２３４５']
+
+        async def run(async_tagger):
+            try:
+                outputs = await asyncio.gather(*[async_tagger.tagging(text) for text in texts])
+                words = await asyncio.gather(*[async_tagger.wakati(text) for text in texts])
+                return outputs, words
+            finally:
+                await async_tagger.close()
+
+        async_tagger = AsyncTagger(max_delay=0.01)
+        outputs, words = asyncio.run(run(async_tagger))
+        self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                         [str(output) for output in outputs])
+        self.assertEqual([nagisa.wakati(text) for text in texts], words)
+        self.assertEqual({'requests': 8, 'groups': 2}, async_tagger.info())
+
+        # test_72
+        class FailingTagger(object):
+            def wakati_batch(self, texts, lower=False, batch_size=32):
+                if 'error' in texts:
+                    raise ValueError('error')
+                return [list(text) for text in texts]
+
+        async def run_failing():
+            async_tagger = AsyncTagger(FailingTagger(), max_batch_size=2)
+            results = await asyncio.gather(async_tagger.wakati('ab'), async_tagger.wakati('error'),
+                                           async_tagger.wakati('c'), return_exceptions=True)
+            await async_tagger.close()
+            return results, async_tagger.info()
+
+        results, info = asyncio.run(run_failing())
+        self.assertEqual(['a', 'b'], results[0])
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(['c'], results[2])
+        self.assertEqual(2, info['groups'])
+
+
+    @unittest.skipIf(not hasattr(socket, 'AF_UNIX'), 'Unix domain sockets are not available')
+    def test_server(self):
+        # test_73
+        from nagisa.server import Server
+        from nagisa.client import Client, ServerError
+        texts = ['Pythonで簡単に使えるツールです', '', 'こんばんは😀', 'ｺﾝﾊﾞﾝﾊ１２３４５']
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'nagisa.sock')
+            with Server(nagisa.Tagger(engine='numpy'), path):
+                with Client(path, chunk_size=3) as client:
+                    self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                                     [str(output) for output in client.tagging_batch(texts)])
+                    self.assertEqual(nagisa.wakati(texts[0]), client.wakati(texts[0]))
+                    self.assertEqual(['default'], client.info()['models'])
+
+                    # test_74
+                    with self.assertRaises(ServerError):
+                        client.wakati(None)
+                    self.assertEqual(nagisa.wakati(texts[2]), client.wakati(texts[2]))
+                with Client(path, model='other') as client:
+                    with self.assertRaises(ServerError):
+                        client.wakati(texts[0])
+            self.assertFalse(os.path.exists(path))
+
+            # test_87
+            # A file which is not a socket is not removed.
+            with open(path, 'w') as f:
+                f.write('not a socket')
+            with self.assertRaises(RuntimeError):
+                Server(nagisa.Tagger(engine='numpy'), path).start()
+            self.assertTrue(os.path.isfile(path))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+    def test_cli(self):
+        # test_75
+        import gzip
+        import json
+        import nagisa.cli as cli
+        from nagisa.mecab_system_eval import readFile
+        texts = ['Pythonで簡単に使えるツールです', '', 'ｺﾝﾊﾞﾝﾊ１２３４５', '3月に見た「3月のライオン」']
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            input_fn = os.path.join(tmp_dir, 'input.txt.gz')
+            with gzip.open(input_fn, 'wb') as f:
+                f.write('\n'.join(texts).encode('utf-8'))
+            dict_fn = os.path.join(tmp_dir, 'user.dict')
+            with open(dict_fn, 'wb') as f:
+                f.write('3月のライオン\n'.encode('utf-8'))
+
+            def run(*args):
+                output_fn = os.path.join(tmp_dir, 'output.txt')
+                cli.main([input_fn, '-o', output_fn, '--chunk_size', '3'] + list(args))
+                with open(output_fn, 'rb') as f:
+                    return f.read().decode('utf-8')
+
+            self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                             run().splitlines())
+            self.assertEqual([' '.join(nagisa.wakati(text)) for text in texts],
+                             run('--format', 'wakati').splitlines())
+            self.assertIn('3月のライオン/名詞', run('--single_word_list', dict_fn))
+
+            # test_76
+            output_fn = os.path.join(tmp_dir, 'output.txt')
+            with open(output_fn, 'wb') as f:
+                f.write(run('--format', 'mecab').encode('utf-8'))
+            sents = readFile(output_fn)
+            self.assertEqual(len(texts), len(sents))
+            self.assertEqual([w.encode('utf-8') for w in nagisa.wakati(texts[0])],
+                             [surface for surface, _ in sents[0]])
+
+            objs = [json.loads(line) for line in run('--format', 'jsonl').splitlines()]
+            self.assertEqual(texts, [obj['text'] for obj in objs])
+            self.assertEqual(['ｺﾝﾊﾞﾝﾊ', '１', '２'], objs[2]['words'][:3])
+            self.assertEqual([[0, 6], [6, 7], [7, 8]], objs[2]['offsets'][:3])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+    def test_stats(self):
+        # test_77
+        texts = ['Pythonで簡単に使えるツールです', '', 'こんばんは😀']
+        observed = []
+        stats_tagger = nagisa.Tagger(engine='numpy', cache_size=10)
+        self.assertIsNone(stats_tagger.stats)
+        stats = stats_tagger.enable_stats()
+        stats.add_hook(lambda stage, seconds, chars, tokens: observed.append(stage))
+        outputs = stats_tagger.tagging_batch(texts)
+        self.assertEqual([str(nagisa.tagging(text)) for text in texts],
+                         [str(output) for output in outputs])
+        stats_tagger.wakati(texts[0])
+        info = stats.to_dict()
+        num_words = sum(len(output.words) for output in outputs)
+        self.assertEqual(num_words, info['stages']['segment']['tokens'])
+        self.assertEqual(num_words, info['stages']['encode_pt']['tokens'])
+        self.assertEqual(sum(len(text) for text in texts) + len(texts[0]),
+                         info['stages']['preprocess']['chars'])
+        self.assertEqual(4, info['counters']['sentences'])
+        self.assertEqual(1, info['counters']['cache_hits'])
+        self.assertIn('encode_ws', observed)
+
+        # test_78
+        text = stats.to_prometheus(labels={'model': 'v001'})
+        self.assertIn('# TYPE nagisa_stage_seconds histogram', text)
+        self.assertIn('nagisa_stage_seconds_bucket{model="v001",stage="viterbi",le="+Inf"}', text)
+        self.assertIn('nagisa_events_total{model="v001",event="sentences"} 4', text)
+        self.assertIs(stats, stats_tagger.disable_stats())
+        stats_tagger.wakati(texts[2])
+        self.assertEqual(4, stats.to_dict()['counters']['sentences'])
+        self.assertIsNotNone(nagisa.Tagger(engine='numpy', stats=True).stats)
+
+        # test_82
+        # The stats recorded by the worker processes are merged.
+        stats = stats_tagger.enable_stats()
+        outputs = list(stats_tagger.tagging_many(texts * 2, n_jobs=2, chunk_size=2))
+        info = stats.to_dict()
+        self.assertEqual(6, info['counters']['sentences'])
+        self.assertEqual(2 * sum(len(text) for text in texts),
+                         info['stages']['preprocess']['chars'])
+        self.assertEqual([str(nagisa.tagging(text)) for text in texts * 2],
+                         [str(output) for output in outputs])
+
+
     def test_utils(self):
         # test_20
         output = "oov"
@@ -188,6 +827,11 @@ class TestNagisa(unittest.TestCase):
         nagisa.train.mecab_system_eval.print_eval(r)
         self.assertEqual(r, expected_r)
 
+        # test_33
+        system_data = nagisa.train.mecab_system_eval.iterFile(system_file)
+        r = nagisa.train.mecab_system_eval.mecab_eval(list(system_data), answer_data)
+        self.assertEqual(r, expected_r)
+
 
 def suite():
     suite = unittest.TestSuite()